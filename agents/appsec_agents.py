@@ -3,7 +3,7 @@ from langchain_community.agent_toolkits.jira.toolkit import JiraToolkit
 from langchain_community.agent_toolkits.github.toolkit import GitHubToolkit
 
 from langchain_openai import AzureChatOpenAI
-from workshop.integration_anthropic import get_llm, get_jira_toolkit, get_github_toolkit
+from workshop.integration import get_llm, get_jira_toolkit, get_github_toolkit
 
 class AppSecAgents():
 
@@ -19,8 +19,8 @@ class AppSecAgents():
 
   
     def senior_engineer(self):
-        combined_tools = self.jira_toolkit.get_tools()
-        combined_tools.extend(self.github_toolkit.get_tools() )
+        # Toolkits are shared, so combine into a new list rather than extend theirs
+        combined_tools = self.jira_toolkit.get_tools() + self.github_toolkit.get_tools()
         return Agent(
             role='Experienced software engineer',
             goal="""Implement the most maintainable and scalable software adhering to industry best practices and design patterns""",
@@ -42,8 +42,7 @@ class AppSecAgents():
         )
 
     def architect(self):
-        combined_tools = self.jira_toolkit.get_tools()
-        combined_tools.extend(self.github_toolkit.get_tools() )
+        combined_tools = self.jira_toolkit.get_tools() + self.github_toolkit.get_tools()
         return Agent(
             role='SaaS Architect',
             goal="""Ensure the software is designed to be scalable, maintainable, secure and cost effective to operate in a public cloud environment""",
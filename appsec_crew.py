@@ -1,25 +1,50 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 from crewai import Crew
 from textwrap import dedent
 
 from agents.appsec_agents import AppSecAgents
 from tasks.appsec_tasks import AppSecTasks
+from workshop.config import get_crew_config
+from workshop.crew_cache import CrewCache, cached_tools, open_crew_cache
+
+
+def dependency_waves(dependencies):
+  """Group task names into waves; each wave only depends on earlier ones."""
+  done = set()
+  waves = []
+  while len(done) < len(dependencies):
+    wave = [name for name, needs in dependencies.items() if name not in done and set(needs) <= done]
+    if not wave:
+      raise ValueError(f"Task dependencies form a cycle: {sorted(set(dependencies) - done)}")
+    waves.append(wave)
+    done.update(wave)
+  return waves
 
 
 class AppSecCrew:
 
+  def __init__(self, parallel=None, max_workers=None):
+    config = get_crew_config()
+    self.parallel = config['parallel'] if parallel is None else parallel
+    self.max_workers = max_workers or config['max_workers']
+    self.cache = open_crew_cache()
+    self.report = []
 
-  def run(self):
+  def build(self):
+    """The crew's tasks by name, with the names of the tasks they build on."""
     agents = AppSecAgents()
     tasks = AppSecTasks()
 
     architect_agent = agents.architect()
-    senior_engineer_agent = agents.senior_engineer()    
+    senior_engineer_agent = agents.senior_engineer()
     quality_agent = agents.quality_assurance()
     appsec_engineer = agents.appsec_engineer()
-    ticket_manager = agents.ticket_manager()    
+    ticket_manager = agents.ticket_manager()
     code_manager = agents.code_manager()
 
-    #code_review_task = tasks.code_review(appsec_engineer)
+    code_review_task = tasks.code_review(appsec_engineer)
     #rag_code_review_task = tasks.rag_code_review(appsec_engineer)
     assign_ticket_task = tasks.get_ticket_to_fix(senior_engineer_agent)
     #tickets_task = tasks.raise_tickets(senior_engineer_agent)
@@ -28,19 +53,32 @@ class AppSecCrew:
     #create_pr_task = tasks.create_PR(appsec_engineer)
     review_task = tasks.review(architect_agent)
 
-    crew = Crew(
-      agents=[
-        architect_agent,
-        senior_engineer_agent,
-        quality_agent
-      ],
-      tasks=[
-        assign_ticket_task,
-        fix_issues_task,
-        review_task
-      ],
-      verbose=True
-    )
+    if self.parallel:
+      # Reviewing the code and looking up tickets are independent
+      task_graph = {
+        'code_review': (code_review_task, []),
+        'assign_ticket': (assign_ticket_task, []),
+        'fix_issues': (fix_issues_task, ['code_review', 'assign_ticket']),
+        'review': (review_task, ['fix_issues']),
+      }
+    else:
+      # The original crew's tasks, each building on the one before
+      task_graph = {
+        'assign_ticket': (assign_ticket_task, []),
+        'fix_issues': (fix_issues_task, ['assign_ticket']),
+        'review': (review_task, ['fix_issues']),
+      }
+
+    crew_agents = [
+      architect_agent,
+      senior_engineer_agent,
+      quality_agent
+    ]
+
+    # Reuse lookups an earlier, failed run already made
+    for item in crew_agents + [appsec_engineer] + [task for task, _ in task_graph.values()]:
+      if item.tools:
+        item.tools = cached_tools(item.tools, self.cache)
 
     # crew = Crew(
     #   agents=[
@@ -52,13 +90,67 @@ class AppSecCrew:
     #   verbose=True
     # )
 
-    result = crew.kickoff()
-    return result
+    return task_graph
+
+  def run(self):
+    """Run the crew one task at a time, or each wave of independent tasks
+    concurrently in parallel mode; either way completed tasks are cached, so
+    a rerun after a failure resumes where it stopped."""
+    return self.run_waves(self.build(), self.max_workers if self.parallel else 1)
+
+  def run_task(self, name, task, context):
+    """Run one task in its own crew, given the outputs it depends on."""
+    started = time.perf_counter()
+    key = CrewCache.key('task', name, task.description, task.expected_output, task.agent.role, context)
+    output = self.cache.get('task', key) if self.cache is not None else None
+    cached = output is not None
+
+    if not cached:
+      if context:
+        task.description += dedent("""
+
+          Results of the tasks this one builds on:
+          """) + "\n\n".join(context)
+      output = str(Crew(agents=[task.agent], tasks=[task], verbose=True).kickoff())
+      if self.cache is not None:
+        self.cache.put('task', key, output)
+
+    self.report.append({'task': name, 'seconds': time.perf_counter() - started, 'cached': cached})
+    return output
+
+  def run_waves(self, task_graph, max_workers):
+    """Run each wave of tasks whose dependencies are complete on up to
+    max_workers threads."""
+    started = time.perf_counter()
+    self.report = []
+    outputs = {}
+    waves = dependency_waves({name: needs for name, (_, needs) in task_graph.items()})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      for wave in waves:
+        futures = {
+          name: executor.submit(self.run_task, name, task_graph[name][0], [outputs[need] for need in task_graph[name][1]])
+          for name in wave
+        }
+        for name, future in futures.items():
+          outputs[name] = future.result()
+
+    self.print_report(time.perf_counter() - started)
+    return outputs[waves[-1][-1]]
+
+  def print_report(self, elapsed):
+    print("\n## Task timings")
+    for entry in self.report:
+      print(f"{entry['task']:<20} {entry['seconds']:8.1f}s{' (cached)' if entry['cached'] else ''}")
+    sequential = sum(entry['seconds'] for entry in self.report)
+    print(f"{'total':<20} {elapsed:8.1f}s wall clock, {sequential:.1f}s run one after another")
+    if self.cache is not None:
+      print(f"cache: {self.cache.stats}")
 
 if __name__ == "__main__":
   print("## Welcome to GenAI Software AppSec Crew")
   print('-------------------------------')
-  
+
   appsec_crew = AppSecCrew()
   result = appsec_crew.run()
   print("\n\n########################")
@@ -1,11 +1,10 @@
+import argparse
 import itertools
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
 
-from langchain.text_splitter import Language, RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.generic import GenericLoader
-from langchain_community.document_loaders.parsers.txt import TextParser
 from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import Language
-from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_EXTENSIONS, LANGUAGE_SEGMENTERS, LanguageParser
 
 from pathlib import Path
 
@@ -16,20 +15,21 @@ from rich.prompt import Confirm
 from rich.table import Table
 
 from workshop.integration import get_embeddings
-from workshop.loaders import TextBlobLoader, FileSystemModel, TextBlobListLoader
-from workshop.config import get_repo_path, get_db_path
-from workshop.splitters import PHPTextSplitter, CSharpTextSplitter
-from workshop.parsers import PHPSegmenter
-from langchain.document_loaders.helpers import detect_file_encodings
+from workshop.embeddings import ConcurrentEmbeddings
+from workshop.embedding_cache import CachedEmbeddings
+from workshop.loaders import FileSystemModel
+from workshop.config import get_repo_path, get_db_path, get_loader_workers, get_batch_size, get_index_config, get_splitter_workers, get_chunk_config, get_php_span_cache_path, get_dedup_config
+from workshop.indexes import ANN_INDEX_FILE, ann_index_type, build_ann_index, evaluate_index, get_vectors, load_index_meta, make_index_meta, save_index_meta
+from workshop.manifest import BuildManifest
+from workshop.stores import read_build_version, save_database, save_docstore, write_faiss_index, write_index_version, DOCSTORE_FILE
+from workshop.shards import group_shards, is_sharded, remove_shard_names, save_shard_names
+from workshop.pipeline import load_documents, split_documents, assign_chunk_ids, index_documents
+from workshop.splitters import LanguageSplitter
+from workshop.dedup import ChunkDeduplicator, filter_generated
+from workshop.lexical import LEXICAL_DIR, build_lexical_index
 
 console = Console()
 
-LANGUAGE_EXTENSIONS['php'] = Language.PHP
-LANGUAGE_EXTENSIONS['module'] = Language.PHP
-LANGUAGE_EXTENSIONS['inc'] = Language.PHP
-
-LANGUAGE_SEGMENTERS[Language.PHP] = PHPSegmenter
-
 models = [
     # bVenus
     FileSystemModel(
@@ -37,17 +37,23 @@ models = [
         includes=['./**/*'], 
         suffixes=['.php', '.html', '.js', '.cs', '.csproj', '.sln', '.json', '.md', '.yml', '.yaml', '.sh', '.py', '.css', '.sql', '.vbp', '.frm', '.bas', '.cls', '.abap', '.asddls', '.asbdef'],
     ),
-    # src
+    # src - give models a shard name to build and query them as separate shards
     # FileSystemModel(
     #     get_repo_path(),
     #     includes=['./src/**/*'],
     #     suffixes=['.cs', '.csproj', '.sln', '.xml'],
+    #     shard='src',
     # ),
 ]
 
 
 def merge_models(models):
-    return itertools.chain(*[m.yield_paths() for m in models])
+    """Walk every model once, dropping paths matched by more than one model."""
+    seen = set()
+    for path in itertools.chain(*[m.yield_paths() for m in models]):
+        if path not in seen:
+            seen.add(path)
+            yield path
 
 
 progress_cols = [
@@ -58,56 +64,312 @@ progress_cols = [
     TimeElapsedColumn()
 ]
 
-try:
+
+def describe(shard, description):
+    """Progress description, prefixed with the shard name when sharded."""
+    if len(shards) > 1:
+        return f'[{shard.name}] {description}'
+    return description
+
+
+def plan_shard(shard, p):
+    """Walk a shard's models and compare them with its manifest."""
     # Make sure the database path exists
-    Path(get_db_path()).mkdir(parents=True, exist_ok=True)
+    shard.path.mkdir(parents=True, exist_ok=True)
 
-    with Progress(*progress_cols) as p:
-        task_export = p.add_task('Exporting Context Paths', total=None)
+    # Update in place only when both the index and the manifest written with
+    # it exist and its chunks were split and filtered the way they would be
+    # now, otherwise rebuild from scratch
+    manifest = BuildManifest.load(shard.path)
+    settings = {
+        'splitter': LanguageSplitter(**get_chunk_config()).settings(),
+        'dedup': get_dedup_config(),
+    }
+    incremental = (
+        Path(shard.path, 'index.faiss').exists() and manifest.path.exists()
+        and manifest.index_version == read_build_version(shard.path)
+        and manifest.settings == settings
+    )
+    if not incremental:
+        manifest.entries = {}
+    manifest.settings = settings
 
-        with open(f"{get_db_path()}/context_paths", 'w') as f:
-            for pa in p.track(merge_models(models), task_id=task_export):
-                f.write(f'{str(pa)}\n')
-        p.stop_task(task_export)
+    task_scan = p.add_task(describe(shard, 'Scanning Files'), total=None)
+    paths = list(p.track(merge_models(shard.models), task_id=task_scan))
+    p.stop_task(task_scan)
 
-        task_load = p.add_task('Loading Documents', total=None)
+    task_export = p.add_task(describe(shard, 'Exporting Context Paths'), total=len(paths))
 
-        blob_loader = TextBlobListLoader(paths=p.track(merge_models(models), task_id=task_load))
-        loader = GenericLoader(blob_loader, TextParser())
-        
-        documents = loader.load()
+    with open(Path(shard.path, 'context_paths'), 'w') as f:
+        for pa in p.track(paths, task_id=task_export):
+            f.write(f'{str(pa)}\n')
+    p.stop_task(task_export)
 
-        p.stop_task(task_load)
+    task_diff = p.add_task(describe(shard, 'Checking Manifest'), total=len(paths))
+    changes = manifest.diff(p.track(paths, task_id=task_diff))
+    p.stop_task(task_diff)
 
-        task_text = p.add_task('Splitting Texts')
-        python_splitter = CSharpTextSplitter(
-            chunk_size=6000, 
-            chunk_overlap=200
-        )
-        texts = python_splitter.split_documents(p.track(documents, task_id=task_text))
-except Exception:
-    console.print_exception(show_locals=True)
-    raise
+    up_to_date = (
+        incremental and not changes
+        and Path(shard.path, DOCSTORE_FILE).exists()
+        and Path(shard.path, LEXICAL_DIR).exists()
+        and load_index_meta(shard.path).get('config') == get_index_config()
+    )
 
-results = Table(title="Code Input")
-results.add_column("Item", style="cyan")
-results.add_column("Count", justify="right")
-results.add_row("Documents", f"{len(documents)}")
-results.add_row("Texts", f"{len(texts)}")
+    return {
+        'manifest': manifest,
+        'changes': changes,
+        'incremental': incremental,
+        'up_to_date': up_to_date,
+    }
 
-print(results)
 
-if not Confirm.ask('Compute model?'):
-    exit()
+def build_shard(shard, plan, p):
+    """Stream a shard's changed files into its index and save it.
 
-with Progress(*progress_cols) as p:
+    Load -> split -> embed -> add to index streams in batches of
+    get_batch_size() chunks, so memory use follows the batch size rather than
+    the repository size.
+    """
+    manifest = plan['manifest']
+    changes = plan['changes']
+    summary = {'documents': 0, 'texts': 0, 'index_report': None}
+    ids_by_path = {}
 
-    task_embed = p.add_task('Processing Embeddings', total=None)
+    # Embeddings are shared by every shard built in this process, so their
+    # counters are reported as the difference over this shard
     embeddings = get_embeddings()
-    db = FAISS.from_documents(texts, embeddings)
+    stats_before = embedding_stats(embeddings)
+    db = None
+    indexed = set()
+    previous_ids = None
+    if plan['incremental']:
+        db = FAISS.load_local(shard.path, embeddings=embeddings, allow_dangerous_deserialization=True)
+        previous_ids = [db.index_to_docstore_id[position] for position in range(len(db.index_to_docstore_id))]
+        # FAISS.delete rejects the whole list if any id is missing
+        indexed = set(db.index_to_docstore_id.values())
+        stale = [chunk_id for chunk_id in changes.stale if chunk_id in indexed]
+        if stale:
+            db.delete(stale)
+            indexed.difference_update(stale)
+
+    task_load = p.add_task(describe(shard, 'Loading Documents'), total=len(changes.to_load))
+    task_text = p.add_task(describe(shard, 'Splitting Texts'), total=None)
+    task_embed = p.add_task(describe(shard, 'Processing Embeddings'), total=None)
+
+    def count_documents(documents):
+        for document in documents:
+            summary['documents'] += 1
+            yield document
+
+    def count_texts(texts):
+        for text in texts:
+            summary['texts'] += 1
+            yield text
+
+    # PHP is segmented along functions/classes, other languages split along
+    # their own separators; splitting is CPU bound so it runs in a process pool
+    splitter = LanguageSplitter(php_span_cache_path=get_php_span_cache_path(), **get_chunk_config())
+
+    dedup_cfg = get_dedup_config()
+    generated = {}
+    # Chunks still in the index can be shared by exact copies in changed files
+    deduplicator = ChunkDeduplicator(threshold=dedup_cfg['threshold'], indexed_ids=indexed)
+
+    documents = count_documents(load_documents(p.track(changes.to_load, task_id=task_load), max_workers=get_loader_workers()))
+    if dedup_cfg['skip_generated']:
+        documents = filter_generated(documents, generated)
+    texts = p.track(split_documents(documents, splitter, max_workers=get_splitter_workers()), task_id=task_text)
+    if dedup_cfg['dedup_chunks']:
+        texts = deduplicator.filter(texts, ids_by_path)
+    else:
+        texts = assign_chunk_ids(texts, ids_by_path)
+    # Counted after dedup, so Texts is the number of chunks embedded
+    texts = count_texts(texts)
+
+    db = index_documents(
+        texts,
+        embeddings,
+        db=db,
+        batch_size=get_batch_size(),
+        on_batch=lambda batch: p.advance(task_embed, len(batch))
+    )
+
+    p.stop_task(task_load)
+    p.stop_task(task_text)
     p.stop_task(task_embed)
 
-    task_save = p.add_task('Saving Database', total=None)
+    task_save = p.add_task(describe(shard, 'Saving Database'), total=None)
 
-    db.save_local(get_db_path())
+    if db is not None:
+        # The manifest no longer describes the index from here until the
+        # build completes
+        manifest.invalidate()
+        save_database(db, shard.path)
+        save_docstore(db, shard.path)
     p.stop_task(task_save)
+
+    # BM25 over identifiers for hybrid retrieval, numbering chunks as the
+    # flat index does; only the chunks added by this build are tokenized
+    if db is not None:
+        task_lexical = p.add_task(describe(shard, 'Building Lexical Index'), total=None)
+        build_lexical_index(db, shard.path, previous_ids=previous_ids)
+        p.stop_task(task_lexical)
+
+    # Query scripts open the ANN index when one is configured; the flat
+    # index stays the master copy that incremental builds update
+    index_cfg = get_index_config()
+    index_type = ann_index_type(db.index.ntotal, index_cfg) if db is not None else 'flat'
+    if db is not None and index_type != 'flat' and db.index.ntotal > 0:
+        task_ann = p.add_task(describe(shard, f"Building {index_type} Index"), total=None)
+        vectors = get_vectors(db.index)
+        ann_index = build_ann_index(vectors, index_cfg)
+        write_faiss_index(ann_index, Path(shard.path, ANN_INDEX_FILE))
+        meta = make_index_meta(index_cfg, ann_index)
+        summary['index_report'] = evaluate_index(vectors, db.index, ann_index, meta)
+        p.stop_task(task_ann)
+    elif db is not None:
+        # Flat, or too few chunks for the configured ANN index
+        meta = make_index_meta(index_cfg, db.index, index_type='flat')
+
+    if db is not None:
+        save_index_meta(shard.path, meta)
+        manifest.apply(changes, ids_by_path)
+        manifest.index_version = uuid.uuid4().hex
+        manifest.save()
+        write_index_version(shard.path, manifest.index_version)
+
+    summary['Generated Files'] = sum(generated.values())
+    summary['Minified Files'] = generated.get('minified', 0)
+    summary['Duplicate Texts'] = deduplicator.stats['exact']
+    summary['Near-duplicate Texts'] = deduplicator.stats['near']
+
+    for label, value in embedding_stats(embeddings).items():
+        summary[label] = value - stats_before[label]
+
+    return summary
+
+
+def embedding_stats(embeddings):
+    """Counters of the embeddings cache and engine, by summary label."""
+    stats = {}
+    engine = embeddings
+    if isinstance(engine, CachedEmbeddings):
+        stats['Embedding Cache Hits'] = engine.stats['hits']
+        stats['Embedding Cache Misses'] = engine.stats['misses']
+        engine = engine.embeddings
+    if isinstance(engine, ConcurrentEmbeddings):
+        stats['Embedding Requests'] = engine.stats['requests']
+        stats['Throttled Requests'] = engine.stats['throttled']
+        stats['Retried Requests'] = engine.stats['retries']
+    return stats
+
+
+def code_input_table(selected, plans, summaries=None):
+    """Files found per shard and, once built, the files and texts filtered out."""
+    results = Table(title="Code Input")
+    results.add_column("Item", style="cyan")
+    for shard in selected:
+        results.add_column(shard.name, justify="right")
+    for label, attr in [("Added Files", 'added'), ("Changed Files", 'changed'), ("Removed Files", 'removed'), ("Unchanged Files", 'unchanged'), ("Stale Vectors", 'stale')]:
+        results.add_row(label, *[f"{len(getattr(plans[s.name]['changes'], attr))}" for s in selected])
+    if summaries:
+        for label in ["Generated Files", "Minified Files", "Duplicate Texts", "Near-duplicate Texts"]:
+            results.add_row(label, *[f"{summaries.get(s.name, {}).get(label, 0)}" for s in selected])
+    return results
+
+
+def build_shard_process(name):
+    """Plan and build one shard in a worker process, without progress output."""
+    shard = next(s for s in shards if s.name == name)
+    with Progress(*progress_cols, disable=True) as p:
+        return build_shard(shard, plan_shard(shard, p), p)
+
+
+shards = group_shards(models, get_db_path())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the vector database for the configured models.')
+    parser.add_argument('shards', nargs='*', help='Only build these shards (default: all)')
+    parser.add_argument('--parallel', type=int, default=1, help='Build up to this many shards in parallel processes')
+    parser.add_argument('--yes', action='store_true', help='Do not ask before computing embeddings')
+    args = parser.parse_args()
+
+    selected = [s for s in shards if not args.shards or s.name in args.shards]
+    if not selected:
+        print(f"No shards named {', '.join(args.shards)}; available: {', '.join(s.name for s in shards)}")
+        return
+
+    try:
+        with Progress(*progress_cols) as p:
+            plans = {shard.name: plan_shard(shard, p) for shard in selected}
+    except Exception:
+        console.print_exception(show_locals=True)
+        raise
+
+    print(code_input_table(selected, plans))
+
+    pending = [s for s in selected if not plans[s.name]['up_to_date']]
+    for shard in selected:
+        if plans[shard.name]['up_to_date']:
+            plans[shard.name]['manifest'].save()
+
+    # Queries load the shard directories listed here, even a single one
+    if is_sharded(models):
+        save_shard_names(get_db_path(), [s.name for s in shards])
+    else:
+        remove_shard_names(get_db_path())
+
+    if not pending:
+        print('Database is up to date.')
+        return
+
+    if not args.yes and not Confirm.ask('Compute model?'):
+        return
+
+    try:
+        if args.parallel > 1 and len(pending) > 1:
+            with console.status(f'Building {len(pending)} shards in parallel...'):
+                with ProcessPoolExecutor(max_workers=args.parallel) as executor:
+                    summaries = dict(zip([s.name for s in pending], executor.map(build_shard_process, [s.name for s in pending])))
+        else:
+            with Progress(*progress_cols) as p:
+                summaries = {s.name: build_shard(s, plans[s.name], p) for s in pending}
+    except Exception:
+        console.print_exception(show_locals=True)
+        raise
+
+    # Shown again with what the filters dropped from the files that were loaded
+    print(code_input_table(selected, plans, summaries))
+
+    results = Table(title="Build Summary")
+    results.add_column("Item", style="cyan")
+    for shard in pending:
+        results.add_column(shard.name, justify="right")
+    results.add_row("Documents", *[f"{summaries[s.name]['documents']}" for s in pending])
+    results.add_row("Texts", *[f"{summaries[s.name]['texts']}" for s in pending])
+    for label in ["Embedding Cache Hits", "Embedding Cache Misses", "Embedding Requests", "Throttled Requests", "Retried Requests"]:
+        if label in summaries[pending[0].name]:
+            results.add_row(label, *[f"{summaries[s.name].get(label, '')}" for s in pending])
+
+    print(results)
+
+    index_cfg = get_index_config()
+    for shard in pending:
+        index_report = summaries[shard.name]['index_report']
+        if not index_report:
+            continue
+        report = Table(title=describe(shard, f"{index_cfg['type']} Recall@20 vs Flat"))
+        report.add_column("Setting", style="cyan")
+        report.add_column("Recall", justify="right")
+        report.add_column("ms / Query", justify="right")
+        for setting, recall, latency in index_report:
+            report.add_row(setting, f"{recall:.3f}", f"{latency:.3f}")
+
+        print(report)
+        print(f"Saved search setting: nprobe={index_cfg['nprobe']}, ef_search={index_cfg['ef_search']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,73 @@
-from langchain_community.vectorstores import FAISS
-from langchain.schema.messages import SystemMessage
+import json
 
-from workshop.integration import get_embeddings, get_qa
-from workshop.config import get_repo_path, get_db_path, get_output_path
+import requests
+
+from websockets.sync.client import connect
+
+from workshop.config import get_output_path, get_service_config, get_streaming
 
 from rich import print
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.prompt import Prompt
+from rich.spinner import Spinner
 from pathlib import Path
 
 console = Console()
 
-db = None
-qa = None
-
-# --- Load Model & Chatbot
+# --- Connect to the query service (python serve.py), which holds the
+# database, caches and LLM clients for every session
 
-# system_message = SystemMessage(
-#     content="""
-#     This conversation is about a codebase, this codebase is written in PHP and includes frameworks x,y,z. Please constrain all answers to be about this codebase.
-#     """
-# )
+service_url = get_service_config()['url']
+ws_url = service_url.replace('http', 'ws', 1)
 
 with console.status('Starting...') as status:
     try:
-        status.update('Loading [cyan]Context Database...')
-        embeddings = get_embeddings()
-        db = FAISS.load_local(get_db_path(), embeddings=embeddings, allow_dangerous_deserialization=True)
-        console.log('Loading [cyan]Context Database -> [green]DONE')
+        status.update('Connecting to [cyan]Query Service...')
+        health = requests.get(f'{service_url}/health', timeout=10).json()
+        session_id = requests.post(f'{service_url}/sessions', timeout=10).json()['session_id']
+        console.log(f"Connecting to [cyan]Query Service -> [green]DONE[/green] (index {health['version']})")
     except Exception:
-        console.log('Loading [cyan]Context Database -> [red]FAILED')
+        console.log(f'Connecting to [cyan]Query Service -> [red]FAILED[/red] (is serve.py running at {service_url}?)')
         console.print_exception(show_locals=True)
         exit()
-        
-    try:
-        status.update('Loading [cyan]Chat Bot...')
-        retriever = db.as_retriever(
-            search_type="mmr", 
-            search_kwargs={"k": 20, "fetch_k": 30},
-        )
-        [qa, memory] = get_qa(retriever=retriever)
-        console.log('Loading [cyan]Chat Bot -> [green]DONE')
-    except Exception:
-        console.log('Loading [cyan]Chat Bot -> [red]FAILED')
 
 
-# ----- Prompt Loop
+def ask(question):
+    """Ask over HTTP, showing a spinner until the answer is complete."""
+    with console.status('Querying') as q:
+        response = requests.post(f'{service_url}/sessions/{session_id}/ask', json={'question': question})
+        response.raise_for_status()
+        result = response.json()
+        print(Panel(Markdown(result['answer']), title=result['question'], padding=1))
+    return result
 
-# qa(
-#     """
-#     This conversation is about a codebase, this codebase is written in PHP and includes frameworks x,y,z. Please constrain all answers to be about this codebase.
-#     """
-# )
+
+def ask_streaming(websocket, question):
+    """Ask over the WebSocket, rendering the answer as it streams in."""
+    text = ''
+    with Live(Spinner('dots', text='Querying'), console=console, refresh_per_second=12, vertical_overflow='visible') as live:
+        websocket.send(json.dumps({'question': question}))
+        for message in websocket:
+            data = json.loads(message)
+            if data['type'] == 'token':
+                text += data['text']
+                live.update(Panel(Markdown(text), title=question, padding=1))
+            elif data['type'] == 'error':
+                raise RuntimeError(data['error'])
+            else:
+                live.update(Panel(Markdown(data['answer']), title=data['question'], padding=1))
+                return data
+
+
+# ----- Prompt Loop
 
 # Make sure the output path exists
-Path(get_output_path()).mkdir(parents=True, exist_ok=True)   
+Path(get_output_path()).mkdir(parents=True, exist_ok=True)
 file = Path(get_output_path(), "QnALog.txt")
+websocket = connect(f'{ws_url}/sessions/{session_id}/stream') if get_streaming() else None
 with open(file, 'w') as csp:
     while True:
         question = Prompt.ask("Question")
@@ -66,11 +76,19 @@ with open(file, 'w') as csp:
         if question == "quit":
             break
         if question == "undo":
-            memory.chat_memory.messages.pop()
-            memory.chat_memory.messages.pop()
+            requests.post(f'{service_url}/sessions/{session_id}/undo')
             continue
 
-        with console.status('Querying') as q:
-            result = qa.invoke(question)
-            print(Panel(Markdown(result['answer']), title=result['question'], padding=1))
-            csp.write('Answer:' + result['answer'] + '\n')
+        result = ask(question) if websocket is None else ask_streaming(websocket, question)
+        csp.write('Answer:' + result['answer'] + '\n')
+
+        if result['time_to_first_token'] is not None and websocket is not None:
+            console.log(f"First token after {result['time_to_first_token']:.2f}s, answered in {result['seconds']:.2f}s")
+        if result['cached']:
+            console.log(f"Answered from cache ({result['generated_question']})")
+        if 'query_cache' in result:
+            console.log(f"Query cache: {result['query_cache']}")
+
+if websocket is not None:
+    websocket.close()
+requests.delete(f'{service_url}/sessions/{session_id}')
@@ -1,9 +1,11 @@
-from langchain_community.vectorstores import FAISS
 from langchain.schema.messages import SystemMessage
 from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import EmbeddingsFilter
 
 from workshop.integration import get_embeddings, get_qa
+from workshop.stores import load_database
+from workshop.retrievers import get_retriever
+from workshop.compressors import StoredVectorFilter
+from workshop.embedding_cache import MemoizedQueryEmbeddings
 from workshop.config import get_repo_path, get_db_path, get_similarity_threshold, get_output_path
 
 from rich import print
@@ -29,8 +31,9 @@ qa = None
 with console.status('Starting...') as status:
     try:
         status.update('Loading [cyan]Context Database...')
-        embeddings = get_embeddings()
-        db = FAISS.load_local(get_db_path(), embeddings=embeddings, allow_dangerous_deserialization=True)
+        # The retriever and the filter share one embedding per question
+        embeddings = MemoizedQueryEmbeddings(get_embeddings())
+        db = load_database(embeddings, get_db_path())
         console.log('Loading [cyan]Context Database -> [green]DONE')
     except Exception:
         console.log('Loading [cyan]Context Database -> [red]FAILED')
@@ -39,11 +42,12 @@ with console.status('Starting...') as status:
         
     try:
         status.update('Loading [cyan]Chat Bot...')
-        retriever = db.as_retriever(
+        retriever = get_retriever(
+            db,
             search_type="mmr",
             search_kwargs={"k": 20, "fetch_k": 50},
         )
-        embeddings_filter = EmbeddingsFilter(embeddings=embeddings, similarity_threshold=get_similarity_threshold())
+        embeddings_filter = StoredVectorFilter(store=db, similarity_threshold=get_similarity_threshold())
         compression_retriever = ContextualCompressionRetriever(
             base_compressor=embeddings_filter, base_retriever=retriever
 )
@@ -1,8 +1,12 @@
-from langchain_community.vectorstores import FAISS
+import time
+
 from langchain.schema.messages import SystemMessage
 
 from workshop.integration import get_embeddings, get_qa
-from workshop.config import get_repo_path, get_db_path, get_output_path
+from workshop.stores import load_database
+from workshop.retrievers import get_retriever
+from workshop.batch import BatchRunner, BatchTask, write_report
+from workshop.config import get_repo_path, get_db_path, get_output_path, get_batch_config
 
 from rich import print
 from rich.console import Console
@@ -30,7 +34,7 @@ with console.status('Starting...') as status:
     try:
         status.update('Loading [cyan]Context Database...')
         embeddings = get_embeddings()
-        db = FAISS.load_local(get_db_path(), embeddings=embeddings)
+        db = load_database(embeddings, get_db_path())
         console.log('Loading [cyan]Context Database -> [green]DONE')
     except Exception:
         console.log('Loading [cyan]Context Database -> [red]FAILED')
@@ -39,7 +43,8 @@ with console.status('Starting...') as status:
         
     try:
         status.update('Loading [cyan]Chat Bot...')
-        retriever = db.as_retriever(
+        retriever = get_retriever(
+            db,
             search_type="mmr", # Also test "similarity"
             search_kwargs={"k": 20, "fetch_k": 50},
         )
@@ -58,28 +63,33 @@ with console.status('Starting...') as status:
 # )
 
 # -- Generate BaseEntity class
-result = qa.invoke("Create an abstract class named BaseEntity for other EntityFramework classes to inherit. Add a required property TenantID of type Guid. Respond with the full code for the updated file")
-file = Path(get_output_path(), "BaseEntity.cs")
-with open(file, 'w') as csp:
-    csp.writelines(result['answer'])
+base_entity = BatchTask("BaseEntity.cs", "Create an abstract class named BaseEntity for other EntityFramework classes to inherit. Add a required property TenantID of type Guid. Respond with the full code for the updated file", Path(get_output_path(), "BaseEntity.cs"))
 
 with open ("EntityFiles.txt", 'r') as wsp:
     file_list = wsp.readlines() 
 
     file_list = [x.split("\n")[0] for x in file_list]
 
-    errors = {}
-    sql_server_sp = {}
-    model_response = {}
-
-    for file_name in tqdm(file_list, "Converting files..."):
-        try:
-            model_response[file_name] = qa.invoke("Modify the " + file_name + " file to also inherit BaseEntity, do not modify the current code in any other way. Respond with the full content for the updated file")
-            file = Path(get_output_path(), file_name)
-            with open(file, 'w') as csp:
-                csp.writelines(model_response[file_name]['answer'])
-            print("Processed " + file_name + " successfully")
-            memory.chat_memory.clear()
-        except Exception as e:
-            errors[file_name] = e
-            print("Error Processing " + file_name + ". Error: " + str(e))
+# Files already written by an earlier run are skipped, so an interrupted run can be resumed
+tasks = [base_entity] + [
+    BatchTask(file_name, "Modify the " + file_name + " file to also inherit BaseEntity, do not modify the current code in any other way. Respond with the full content for the updated file", Path(get_output_path(), file_name))
+    for file_name in file_list
+]
+
+# Every task gets its own chain, so conversations do not leak between files
+runner = BatchRunner(lambda: get_qa(retriever=retriever), **get_batch_config())
+started = time.time()
+
+with tqdm(total=len(tasks), desc="Converting files...") as progress:
+    def on_done(task, result):
+        progress.update(1)
+        if result['status'] == 'done':
+            print("Processed " + task.name + " successfully")
+        else:
+            print("Error Processing " + task.name + ". Error: " + result['error'])
+
+    results = runner.run(tasks, on_done=on_done)
+    progress.update(sum(1 for result in results.values() if result['status'] == 'skipped'))
+
+report = write_report(Path(get_output_path(), "batch_report.json"), results, started)
+console.log(f"Batch finished in {report['seconds']:.0f}s: " + ", ".join(f"{count} {status}" for status, count in report['counts'].items()))
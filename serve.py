@@ -0,0 +1,8 @@
+import uvicorn
+
+from workshop.config import get_service_config
+
+# One process holds the index for every session; requests run on its event loop
+if __name__ == '__main__':
+    cfg = get_service_config()
+    uvicorn.run("workshop.service:app", host=cfg['host'], port=cfg['port'], workers=1)
@@ -1,6 +1,6 @@
 from crewai import Task
 from textwrap import dedent
-from workshop.integration_anthropic import get_llm, get_jira_toolkit, get_github_toolkit
+from workshop.integration import get_llm, get_jira_toolkit, get_github_toolkit
 from tools.rag_tool import GetCode
 from crewai_tools import GithubSearchTool
 from workshop.config import get_repo_path, get_github_repo, get_github_config
@@ -16,6 +16,7 @@ class AppSecTasks():
     return Task(description=dedent(f"""
         Review the code in the repository from the base branch for application security vulnerabilities. Describe each vulnerability found and provide a recommendation for how to fix it.
       """),
+      expected_output='A list of the vulnerabilities found, each with its location and a recommended fix.',
       agent=agent,
       tools=self.github_toolkit.get_tools()
     )
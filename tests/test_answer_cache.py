@@ -0,0 +1,33 @@
+import sqlite3
+
+from langchain_core.documents import Document
+
+from workshop.answer_cache import SemanticAnswerCache
+
+
+def test_lookup_returns_similar_answer(tmp_path):
+    cache = SemanticAnswerCache(tmp_path / 'answers.sqlite', 'v1', threshold=0.9)
+    cache.put('what does login do', [1.0, 0.0], 'It logs in.', [Document(page_content='class Login', metadata={'source': 'login.cs'})])
+
+    hit = cache.lookup([0.99, 0.05])
+    assert hit['answer'] == 'It logs in.'
+    assert hit['source_documents'][0].metadata['source'] == 'login.cs'
+    assert cache.lookup([0.0, 1.0]) is None
+
+
+def test_other_versions_are_dropped(tmp_path):
+    SemanticAnswerCache(tmp_path / 'answers.sqlite', 'v1').put('q', [1.0, 0.0], 'a', [])
+    assert SemanticAnswerCache(tmp_path / 'answers.sqlite', 'v2').lookup([1.0, 0.0]) is None
+
+
+def test_row_deleted_by_another_process_is_a_miss(tmp_path):
+    path = tmp_path / 'answers.sqlite'
+    cache = SemanticAnswerCache(path, 'v1')
+    cache.put('q', [1.0, 0.0], 'a', [])
+
+    with sqlite3.connect(path) as conn:
+        conn.execute('DELETE FROM answers')
+
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats == {'hits': 0, 'misses': 2}
@@ -0,0 +1,48 @@
+from langchain_core.tools import tool
+
+from workshop.crew_cache import CrewCache, cached_tools
+
+
+def make_tools(calls):
+    @tool
+    def search_code(query: str) -> str:
+        """Search the code."""
+        calls.append(('search_code', query))
+        return f"{len(calls)} results for {query}"
+
+    @tool
+    def create_file(content: str) -> str:
+        """Create a file."""
+        calls.append(('create_file', content))
+        return 'created'
+
+    return [search_code, create_file]
+
+
+def test_read_only_results_are_cached(tmp_path):
+    calls = []
+    search, _ = cached_tools(make_tools(calls), CrewCache(tmp_path / 'crew.sqlite'))
+    assert search.run('login') == search.run('login')
+    assert calls == [('search_code', 'login')]
+
+
+def test_writes_always_run_and_invalidate_reads(tmp_path):
+    calls = []
+    cache = CrewCache(tmp_path / 'crew.sqlite')
+    search, create = cached_tools(make_tools(calls), cache)
+
+    first = search.run('login')
+    create.run('class Login {}')
+    create.run('class Login {}')
+    assert search.run('login') != first
+    assert [name for name, _ in calls] == ['search_code', 'create_file', 'create_file', 'search_code']
+
+
+def test_results_persist_between_runs(tmp_path):
+    calls = []
+    search, _ = cached_tools(make_tools(calls), CrewCache(tmp_path / 'crew.sqlite'))
+    search.run('login')
+
+    search, _ = cached_tools(make_tools(calls), CrewCache(tmp_path / 'crew.sqlite'))
+    search.run('login')
+    assert len(calls) == 1
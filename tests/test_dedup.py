@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from workshop.dedup import ChunkDeduplicator, content_id, is_generated
+
+
+def chunk(text, source='a.cs'):
+    return Document(page_content=text, metadata={'source': source})
+
+
+def test_exact_duplicate_ignores_whitespace():
+    deduplicator = ChunkDeduplicator()
+    assert not deduplicator.is_duplicate('if (balance > limit)\n    return;', 'a.cs')
+    assert deduplicator.is_duplicate('if (balance > limit) return;', 'a.cs')
+    assert deduplicator.stats['exact'] == 1
+
+
+def test_operators_are_part_of_exact_hash():
+    deduplicator = ChunkDeduplicator()
+    assert not deduplicator.is_duplicate('if (balance > limit) return;', 'a.cs')
+    assert not deduplicator.is_duplicate('if (balance < limit) return;', 'a.cs')
+
+
+def test_near_duplicate_within_file():
+    body = ' '.join(f'var{i} = compute(var{i - 1});' for i in range(1, 60))
+    deduplicator = ChunkDeduplicator(threshold=0.8)
+    assert not deduplicator.is_duplicate(body, 'a.cs')
+    assert deduplicator.is_duplicate(body + ' extra = 1;', 'a.cs')
+    assert deduplicator.stats['near'] == 1
+
+
+def test_copies_in_other_files_share_one_chunk():
+    texts = [chunk('shared helper code', 'a.cs'), chunk('shared helper code', 'b.cs'), chunk('own code', 'b.cs')]
+    ids_by_path = {}
+    kept = list(ChunkDeduplicator().filter(texts, ids_by_path))
+
+    shared = content_id('shared helper code')
+    assert [text.page_content for text in kept] == ['shared helper code', 'own code']
+    assert ids_by_path == {'a.cs': [shared], 'b.cs': [shared, content_id('own code')]}
+
+
+def test_chunks_already_indexed_are_not_embedded_again():
+    ids_by_path = {}
+    deduplicator = ChunkDeduplicator(indexed_ids={content_id('vendored code')})
+    assert list(deduplicator.filter([chunk('vendored code', 'c.cs')], ids_by_path)) == []
+    assert ids_by_path == {'c.cs': [content_id('vendored code')]}
+
+
+def test_near_duplicates_are_only_dropped_within_a_file():
+    body = ' '.join(f'var{i} = compute(var{i - 1});' for i in range(1, 60))
+    ids_by_path = {}
+    texts = [chunk(body, 'a.cs'), chunk(body + ' extra = 1;', 'b.cs'), chunk(body + ' more = 2;', 'b.cs')]
+    kept = list(ChunkDeduplicator(threshold=0.8).filter(texts, ids_by_path))
+
+    # A near duplicate has no chunk to share, so it is not recorded
+    assert [text.metadata['source'] for text in kept] == ['a.cs', 'b.cs']
+    assert [len(ids) for ids in ids_by_path.values()] == [1, 1]
+
+
+def test_is_generated():
+    assert is_generated('app.min.js', 'x') == 'suffix'
+    assert is_generated('Model.cs', '// <auto-generated>\nclass Model {}') == 'marker'
+    assert is_generated('bundle.js', 'x' * 6000) == 'minified'
+    assert is_generated('Model.cs', 'class Model\n{\n}\n') is None
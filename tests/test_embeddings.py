@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from langchain_openai import AzureOpenAIEmbeddings
+
+from workshop.embeddings import ConcurrentEmbeddings
+
+
+def count_words(texts):
+    # Stands in for tiktoken, whose encoding files may not be downloadable
+    return [len(text.split()) for text in texts]
+
+
+class StubEmbeddingsServer(ThreadingHTTPServer):
+    """Local stand-in for the Azure OpenAI embeddings API.
+
+    Each input is embedded as [len(text), position in its request]. The first
+    `fail` requests are answered with `fail_status` (and a Retry-After for
+    429s); every request's inputs and the peak number in flight are recorded.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubEmbeddingsHandler)
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail = 0
+        self.fail_status = 429
+        self.delay = 0.05
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append(body['input'])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failing = server.fail > 0
+            if failing:
+                server.fail -= 1
+        try:
+            time.sleep(server.delay)
+            if failing:
+                self._send(server.fail_status, {'error': {'message': 'stub failure', 'code': str(server.fail_status)}}, {'retry-after-ms': '50'})
+                return
+            self._send(200, {
+                'object': 'list',
+                'model': 'stub',
+                'data': [
+                    {'object': 'embedding', 'index': i, 'embedding': [float(len(text)), float(i)]}
+                    for i, text in enumerate(body['input'])
+                ],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def server():
+    server = StubEmbeddingsServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_embeddings(server, **kwargs):
+    provider = AzureOpenAIEmbeddings(
+        azure_endpoint=server.url,
+        azure_deployment='stub',
+        api_key='stub',
+        api_version='2024-02-01',
+        chunk_size=kwargs.get('max_batch_items', 16),
+        max_retries=0,
+        check_embedding_ctx_length=False,
+    )
+    return ConcurrentEmbeddings(provider, backoff=0.01, token_counter=count_words, **kwargs)
+
+
+def texts(count):
+    return [f'text {i} ' + 'x' * i for i in range(count)]
+
+
+def test_batches_within_item_limit_and_keeps_order(server):
+    inputs = texts(40)
+    vectors = make_embeddings(server, max_batch_items=16).embed_documents(inputs)
+
+    assert sorted(len(batch) for batch in server.requests) == [8, 16, 16]
+    assert [vector[0] for vector in vectors] == [float(len(text)) for text in inputs]
+
+
+def test_batches_within_token_limit(server):
+    inputs = ['word ' * 30] * 6
+    make_embeddings(server, max_batch_items=16, max_batch_tokens=70).embed_documents(inputs)
+
+    # 30 tokens each, so two texts per request
+    assert [len(batch) for batch in server.requests] == [2, 2, 2]
+
+
+def test_concurrency_is_bounded(server):
+    embeddings = make_embeddings(server, max_batch_items=1, max_concurrency=3)
+    embeddings.embed_documents(texts(12))
+
+    assert len(server.requests) == 12
+    assert 1 < server.max_in_flight <= 3
+
+
+def test_throttling_backs_off_and_retries(server):
+    server.fail = 2
+    embeddings = make_embeddings(server, max_batch_items=4, max_concurrency=4)
+    inputs = texts(16)
+    vectors = embeddings.embed_documents(inputs)
+
+    assert [vector[0] for vector in vectors] == [float(len(text)) for text in inputs]
+    assert embeddings.stats['throttled'] == 2
+    assert embeddings.stats['retries'] == 2
+    assert embeddings.stats['requests'] == 6
+    # Halved for each 429 and not yet recovered, and paused for Retry-After
+    assert embeddings._limit < 4
+    assert embeddings._paused_until > 0
+
+
+def test_server_errors_are_retried(server):
+    server.fail = 1
+    server.fail_status = 500
+    embeddings = make_embeddings(server, max_batch_items=16)
+
+    assert len(embeddings.embed_documents(texts(3))) == 3
+    assert embeddings.stats == {'requests': 2, 'throttled': 0, 'retries': 1}
+
+
+def test_client_errors_are_not_retried(server):
+    server.fail = 1
+    server.fail_status = 400
+    embeddings = make_embeddings(server, max_batch_items=16)
+
+    with pytest.raises(Exception):
+        embeddings.embed_documents(texts(3))
+    assert len(server.requests) == 1
@@ -0,0 +1,48 @@
+import faiss
+import numpy as np
+
+from workshop.indexes import ann_index_type, build_ann_index, evaluate_index, make_index_meta
+
+CONFIG = {
+    'type': 'ivf_pq', 'nlist': 0, 'nprobe': 8, 'pq_m': 8, 'pq_nbits': 8,
+    'hnsw_m': 16, 'ef_construction': 40, 'ef_search': 32, 'train_size': 100000,
+}
+
+
+def flat_index(vectors):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def random_vectors(count, dims=16):
+    return np.random.default_rng(0).random((count, dims), dtype=np.float32)
+
+
+def test_small_shards_fall_back_to_flat():
+    assert ann_index_type(100, CONFIG) == 'flat'
+    assert ann_index_type(256, CONFIG) == 'ivf_pq'
+    assert ann_index_type(10, dict(CONFIG, type='hnsw')) == 'hnsw'
+
+
+def test_ivf_nlist_is_clamped_to_the_vectors():
+    vectors = random_vectors(50)
+    index = build_ann_index(vectors, dict(CONFIG, type='ivf_flat', nlist=100))
+    assert index.ntotal == 50
+
+
+def test_recall_excludes_self_matches():
+    vectors = random_vectors(300)
+    flat = flat_index(vectors)
+    meta = make_index_meta(dict(CONFIG, type='flat'), flat)
+
+    # An index holding only the query's own vector finds none of its neighbours
+    sample = np.random.default_rng(1).choice(300, 1, replace=False)
+    only_self = faiss.IndexIDMap(faiss.IndexFlatL2(vectors.shape[1]))
+    only_self.add_with_ids(vectors[sample], sample.astype(np.int64))
+
+    [_, (_, recall, _)] = evaluate_index(vectors, flat, only_self, meta, queries=1, settings=[0])
+    assert recall == 0.0
+
+    [_, (_, recall, _)] = evaluate_index(vectors, flat, flat_index(vectors), meta, queries=20, settings=[0])
+    assert recall == 1.0
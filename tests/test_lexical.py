@@ -0,0 +1,71 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from workshop.lexical import LexicalIndex, build_lexical_index, tokenize
+from workshop.retrievers import reciprocal_rank_fusion
+
+CHUNKS = [
+    'public User GetUserById(int id) { return users.Find(id); }',
+    'def get_user_by_id(user_id): return db.query(user_id)',
+    'SELECT * FROM Orders WHERE OrderId = @orderId',
+    'class InvoiceRenderer { void Render() {} }',
+]
+
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize('GetUserById get_user_by_id')
+    assert 'getuserbyid' in tokens and 'get_user_by_id' in tokens
+    assert tokens.count('user') == 2
+
+
+def test_search_ranks_identifier_matches(tmp_path):
+    db = FAISS.from_documents([Document(page_content=text) for text in CHUNKS], DeterministicFakeEmbedding(size=8))
+    build_lexical_index(db, tmp_path)
+    index = LexicalIndex.load(tmp_path)
+
+    positions = [position for position, _ in index.search('GetUserById', k=4)]
+    assert positions[0] == 0
+    # The SQL chunk only shares the "id" part of OrderId, so it ranks last
+    assert positions == [0, 1, 2]
+    assert [position for position, _ in index.search('invoice renderer')] == [3]
+    assert index.search('nothing matches this') == []
+
+
+def test_rebuild_replaces_index(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    build_lexical_index(FAISS.from_documents([Document(page_content=CHUNKS[0])], embeddings), tmp_path)
+    build_lexical_index(FAISS.from_documents([Document(page_content=CHUNKS[3])], embeddings), tmp_path)
+
+    index = LexicalIndex.load(tmp_path)
+    assert index.search('GetUserById') == []
+    assert [position for position, _ in index.search('InvoiceRenderer')] == [0]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['lexical']
+
+
+def test_incremental_update_matches_a_full_build(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    db = FAISS.from_documents([Document(page_content=text) for text in CHUNKS[:3]], embeddings, ids=['a', 'b', 'c'])
+    build_lexical_index(db, tmp_path / 'incremental')
+    previous_ids = [db.index_to_docstore_id[position] for position in range(3)]
+
+    db.delete(['b'])
+    db.add_documents([Document(page_content=CHUNKS[3])], ids=['d'])
+
+    # Only the added chunk is read from the docstore
+    searched = []
+    search = db.docstore.search
+    monkeypatch.setattr(db.docstore, 'search', lambda doc_id: searched.append(doc_id) or search(doc_id))
+    build_lexical_index(db, tmp_path / 'incremental', previous_ids=previous_ids)
+    assert searched == ['d']
+
+    build_lexical_index(db, tmp_path / 'full')
+    incremental, full = LexicalIndex.load(tmp_path / 'incremental'), LexicalIndex.load(tmp_path / 'full')
+    for name in ('terms', 'offsets', 'docs', 'tfs', 'doc_lens'):
+        assert (getattr(incremental, name) == getattr(full, name)).all()
+    assert [position for position, _ in incremental.search('InvoiceRenderer')] == [2]
+
+
+def test_reciprocal_rank_fusion_prefers_documents_in_both_rankings():
+    a, b, c = (Document(page_content=text, metadata={'chunk_id': text}) for text in 'abc')
+    assert reciprocal_rank_fusion([[a, b], [c, b]], k=3) == [b, a, c]
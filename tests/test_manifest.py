@@ -0,0 +1,66 @@
+import os
+
+from workshop.manifest import BuildManifest
+from workshop.splitters import LanguageSplitter
+
+
+def test_diff_classifies_files(tmp_path):
+    kept, edited, touched, new = (tmp_path / name for name in ('kept.cs', 'edited.cs', 'touched.cs', 'new.cs'))
+    for path in (kept, edited, touched):
+        path.write_text('class A {}')
+
+    manifest = BuildManifest(tmp_path / 'manifest.json')
+    changes = manifest.diff([kept, edited, touched])
+    manifest.apply(changes, {str(kept): ['k'], str(edited): ['e'], str(touched): ['t']})
+    manifest.entries['gone.cs'] = {'size': 0, 'mtime': 0, 'hash': '', 'ids': ['g']}
+
+    edited.write_text('class B {}')
+    new.write_text('class C {}')
+    st = os.stat(touched)
+    os.utime(touched, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    changes = manifest.diff([kept, edited, touched, new])
+    assert changes.added == [new]
+    assert changes.changed == [edited]
+    assert sorted(changes.unchanged) == sorted([kept, touched])
+    assert changes.removed == ['gone.cs']
+    assert sorted(changes.stale) == ['e', 'g']
+
+
+def test_splitter_settings_round_trip(tmp_path):
+    settings = LanguageSplitter(chunk_size=1500, chunk_overlap=50, length_mode='tokens').settings()
+    manifest = BuildManifest(tmp_path / 'manifest.json', settings=settings)
+    manifest.save()
+
+    loaded = BuildManifest.load(tmp_path)
+    assert loaded.settings == settings
+    assert loaded.settings != LanguageSplitter(chunk_size=6000, chunk_overlap=200).settings()
+
+
+def test_index_version_round_trip_and_invalidate(tmp_path):
+    manifest = BuildManifest(tmp_path / 'manifest.json', index_version='v1')
+    manifest.save()
+    assert BuildManifest.load(tmp_path).index_version == 'v1'
+
+    # A build replacing the index removes the manifest until it completes
+    manifest.invalidate()
+    assert not manifest.path.exists()
+    assert BuildManifest.load(tmp_path).index_version is None
+
+
+def test_shared_chunks_are_stale_once_no_unchanged_file_refers_to_them(tmp_path):
+    a, b, c = (tmp_path / name for name in ('a.cs', 'b.cs', 'c.cs'))
+    for path in (a, b, c):
+        path.write_text('class A {}')
+
+    manifest = BuildManifest(tmp_path / 'manifest.json')
+    changes = manifest.diff([a, b, c])
+    manifest.apply(changes, {str(a): ['shared', 'a'], str(b): ['shared', 'shared'], str(c): ['shared', 'c']})
+    assert manifest.entries[str(b)]['ids'] == ['shared']
+
+    a.write_text('class B {}')
+    changes = manifest.diff([a, c])
+    assert changes.stale == ['a']
+
+    changes = manifest.diff([])
+    assert changes.stale == ['shared', 'a', 'c']
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from workshop.query_cache import QueryCache, QueryCachedEmbeddings, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question('  What does   Login do?? ') == 'what does login do'
+
+
+def test_hits_persist_and_count_saved_time(tmp_path):
+    cache = QueryCache(tmp_path / 'queries.sqlite', 'v1')
+    assert cache.get('embedding', 'What does login do?') is None
+    cache.put('embedding', 'What does login do?', b'vector', 0.5)
+
+    reopened = QueryCache(tmp_path / 'queries.sqlite', 'v1')
+    assert reopened.get('embedding', 'what does login do') == b'vector'
+    assert reopened.stats['embedding'] == {'hits': 1, 'misses': 0, 'saved': 0.5}
+
+
+def test_versions_and_kinds_do_not_share_entries(tmp_path):
+    cache = QueryCache(tmp_path / 'queries.sqlite', 'v1')
+    cache.put('retrieval:mmr', 'question', 'documents', 0.1)
+
+    assert cache.get('retrieval:similarity', 'question') is None
+    assert QueryCache(tmp_path / 'queries.sqlite', 'v2').get('retrieval:mmr', 'question') is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = QueryCache(tmp_path / 'queries.sqlite', 'v1', max_entries=10, memory_entries=0)
+    for i in range(11):
+        cache.put('embedding', f'question {i}', b'x', 0.0)
+
+    [count] = cache._conn.execute('SELECT COUNT(*) FROM queries').fetchone()
+    assert count == 9
+
+
+def test_async_query_embeddings_use_the_cache_off_the_event_loop(tmp_path):
+    cache = QueryCache(tmp_path / 'queries.sqlite', 'v1')
+    threads = []
+    for name in ('get', 'put'):
+        method = getattr(cache, name)
+        setattr(cache, name, lambda *args, method=method: threads.append(threading.get_ident()) or method(*args))
+    embeddings = QueryCachedEmbeddings(DeterministicFakeEmbedding(size=4), cache)
+
+    async def ask():
+        return threading.get_ident(), await embeddings.aembed_query('q'), await embeddings.aembed_query('q')
+
+    loop_thread, first, second = asyncio.run(ask())
+    assert np.allclose(first, second)
+    assert len(threads) == 3 and loop_thread not in threads
+    assert cache.stats['embedding']['hits'] == 1
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+from workshop.shards import group_shards, is_sharded, load_shard_names, remove_shard_names, save_shard_names
+
+
+def test_a_single_named_shard_is_sharded(tmp_path):
+    models = [SimpleNamespace(shard='src')]
+    assert is_sharded(models)
+    assert [(shard.name, shard.path) for shard in group_shards(models, tmp_path)] == [('src', tmp_path / 'src')]
+
+    models = [SimpleNamespace(shard=None)]
+    assert not is_sharded(models)
+    assert [shard.path for shard in group_shards(models, tmp_path)] == [tmp_path]
+
+
+def test_remove_shard_names(tmp_path):
+    save_shard_names(tmp_path, ['src'])
+    assert load_shard_names(tmp_path) == ['src']
+
+    remove_shard_names(tmp_path)
+    remove_shard_names(tmp_path)
+    assert load_shard_names(tmp_path) is None
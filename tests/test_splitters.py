@@ -0,0 +1,31 @@
+import workshop.tokens as tokens
+
+from workshop.splitters import BudgetedTextSplitter
+
+
+class WordEncoder():
+    """Stands in for tiktoken: one token per word, counting every call."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode_ordinary(self, text):
+        self.calls += 1
+        return text.split(' ')
+
+    def decode(self, words):
+        return ' '.join(words)
+
+
+def test_only_chunks_longer_than_max_tokens_in_bytes_are_counted(monkeypatch):
+    encoder = WordEncoder()
+    monkeypatch.setattr(tokens, 'get_encoder', lambda encoding_name=tokens.DEFAULT_ENCODING: encoder)
+    splitter = BudgetedTextSplitter(chunk_size=40, chunk_overlap=0, max_tokens=20, separators=['\n'])
+
+    assert splitter.split_text('a b\nc d') == ['a b\nc d']
+    assert encoder.calls == 0
+
+    # No separator to split on, and 40 one-letter words are over max_tokens
+    long_line = ' '.join('w' * 40)
+    assert splitter.split_text(long_line) == [' '.join('w' * 20)] * 2
+    assert encoder.calls == 2
@@ -0,0 +1,56 @@
+import threading
+
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from workshop.stores import SQLiteDocstore, SQLiteReader, read_index_mmap, save_docstore, write_faiss_index
+
+
+def flat_index(count, dims=8, seed=0):
+    index = faiss.IndexFlatL2(dims)
+    index.add(np.random.default_rng(seed).random((count, dims), dtype=np.float32))
+    return index
+
+
+def test_rewriting_an_index_keeps_mapped_readers_intact(tmp_path):
+    path = tmp_path / 'index.faiss'
+    write_faiss_index(flat_index(100), path)
+    mapped = read_index_mmap(path)
+    query = np.zeros((1, 8), dtype=np.float32)
+    _, before = mapped.search(query, 5)
+
+    # A rebuild with fewer vectors would truncate the file if written in place
+    write_faiss_index(flat_index(10, seed=1), path)
+
+    _, after = mapped.search(query, 5)
+    assert mapped.ntotal == 100
+    assert (before == after).all()
+    assert read_index_mmap(path).ntotal == 10
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['index.faiss']
+
+
+def docstore_db(text):
+    return SimpleNamespace(
+        index_to_docstore_id={0: 'a'},
+        docstore=InMemoryDocstore({'a': Document(page_content=text, metadata={})}),
+    )
+
+
+def test_docstore_reader_keeps_the_file_it_was_loaded_with(tmp_path):
+    save_docstore(docstore_db('old build'), tmp_path)
+    docstore = SQLiteDocstore(SQLiteReader(tmp_path / 'docstore.sqlite'))
+
+    save_docstore(docstore_db('new build'), tmp_path)
+
+    # Lookups from any thread still match the index loaded with the reader
+    found = []
+    thread = threading.Thread(target=lambda: found.append(docstore.search('a').page_content))
+    thread.start()
+    thread.join()
+    assert found == ['old build']
+    assert SQLiteDocstore(SQLiteReader(tmp_path / 'docstore.sqlite')).search('a').page_content == 'new build'
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from workshop.walker import DirectoryWalker, compile_globs
+
+
+def make_tree(root, files):
+    for name, content in files.items():
+        path = Path(root, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def walk(root, **kwargs):
+    return sorted(path.relative_to(root).as_posix() for path in DirectoryWalker(root, **kwargs).walk())
+
+
+def test_compile_globs_anchors_every_pattern():
+    matcher = compile_globs(['vendor/**', 'lib/**'])
+    assert matcher.match('vendor/a.js')
+    assert matcher.match('lib/a.js')
+    assert not matcher.match('vendored_src/a.js')
+    assert not matcher.match('library/a.js')
+
+    # Directory excludes are compiled without the trailing /**
+    matcher = compile_globs(['vendor', 'lib'])
+    assert matcher.match('vendor')
+    assert not matcher.match('vendored_src')
+
+
+def test_excludes_do_not_prune_directories_sharing_a_prefix(tmp_path):
+    make_tree(tmp_path, {
+        'vendor/a.js': '',
+        'lib/b.js': '',
+        'vendored_src/c.js': '',
+        'src/d.js': '',
+    })
+    assert walk(tmp_path, excludes=['vendor/**', 'lib/**']) == ['src/d.js', 'vendored_src/c.js']
+
+
+def test_includes_and_suffixes(tmp_path):
+    make_tree(tmp_path, {
+        'src/a.cs': '',
+        'src/a.txt': '',
+        'src/deep/b.cs': '',
+        'srcgen/c.cs': '',
+        'tests/d.cs': '',
+    })
+    assert walk(tmp_path, includes=['./src/**/*', 'tests/*.cs'], suffixes=['.cs']) == ['src/a.cs', 'src/deep/b.cs', 'tests/d.cs']
+
+
+def test_default_pruned_directories(tmp_path):
+    make_tree(tmp_path, {
+        'node_modules/pkg/index.js': '',
+        'bin/Debug/app.cs': '',
+        '.git/config': '',
+        'app.js': '',
+    })
+    assert walk(tmp_path) == ['app.js']
+
+
+def test_gitignore(tmp_path):
+    make_tree(tmp_path, {
+        '.gitignore': '*.log\nbuild/\n!keep.log\n',
+        'a.log': '',
+        'keep.log': '',
+        'build/out.cs': '',
+        'src/.gitignore': 'generated.cs\n',
+        'src/generated.cs': '',
+        'src/model.cs': '',
+        'generated.cs': '',
+    })
+    assert walk(tmp_path, suffixes=['.cs', '.log']) == ['generated.cs', 'keep.log', 'src/model.cs']
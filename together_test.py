@@ -1,5 +1,5 @@
 from langchain_together import Together
-from workshop.integration_together import get_llm
+from workshop.integration import get_llm
 
 llm = get_llm()
 
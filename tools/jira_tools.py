@@ -1,50 +1,115 @@
-import os
-from dotenv import load_dotenv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import tool
-from jira import JIRA
+from workshop.config import get_jira_tools_config
+from workshop.integration import get_jira_client
+
+
+class TTLCache():
+    """Read results kept for ttl seconds; writes invalidate what they touch."""
+
+    def __init__(self, ttl, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop the entry closest to expiring
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, kind, key=None):
+        """Drop one entry, or every entry of a kind when key is None."""
+        with self._lock:
+            for cached in list(self._entries):
+                if cached[0] == kind and (key is None or cached[1] == key):
+                    del self._entries[cached]
+
+
+_cache = TTLCache(get_jira_tools_config()['cache_ttl'])
+
+
+def search_issues(jql_str):
+    tickets = _cache.get(('search', jql_str))
+    if tickets is None:
+        tickets = _cache.put(('search', jql_str), get_jira_client().search_issues(jql_str))
+    return tickets
+
+
+def get_issue(ticket_id):
+    ticket = _cache.get(('issue', ticket_id))
+    if ticket is None:
+        ticket = _cache.put(('issue', ticket_id), get_jira_client().issue(ticket_id))
+    return ticket
+
+
+def update_issue(ticket_id, summary, description):
+    ticket = get_issue(ticket_id)
+    ticket.update(summary=summary, description=description)
+    # The issue and any search that may list it are now stale
+    _cache.invalidate('issue', ticket_id)
+    _cache.invalidate('search')
+    return ticket
 
-load_dotenv()
 
 class JiraTools():
 
     @tool("Find Jira tickets")
     def find_tickets(query):
         """Useful to find Jira tickets"""
-        jira_server = os.getenv('JIRA_SERVER')
-        jira_email = os.getenv('JIRA_EMAIL')
-        jira_api_key = os.getenv('JIRA_API_KEY')
-        jira = JIRA(server=jira_server, basic_auth=(jira_email, jira_api_key))
         jql_str='type = "Epic" AND status = "To Do" AND Project = "AI Crew"'
-        tickets = jira.search_issues(jql_str)
+        tickets = search_issues(jql_str)
         return tickets
-  
+
     @tool("Retrieve Jira ticket information")
     def fetch_ticket(ticket_id):
         """Useful to retrieve information about a Jira ticket"""
-        jira_server = os.getenv('JIRA_SERVER')
-        jira_email = os.getenv('JIRA_EMAIL')
-        jira_api_key = os.getenv('JIRA_API_KEY')
-        jira = JIRA(server=jira_server, basic_auth=(jira_email, jira_api_key))
-        ticket = jira.issue(ticket_id)
+        ticket = get_issue(ticket_id)
         return ticket
-    
+
     @tool("Create a Jira ticket")
     def create_ticket(project, summary, description):
         """Useful to create a Jira ticket"""
-        jira_server = os.getenv('JIRA_SERVER')
-        jira_email = os.getenv('JIRA_EMAIL')
-        jira_api_key = os.getenv('JIRA_API_KEY')
-        jira = JIRA(server=jira_server, basic_auth=(jira_email, jira_api_key))
-        ticket = jira.create_issue(project=project, summary=summary, description=description)
+        ticket = get_jira_client().create_issue(project=project, summary=summary, description=description)
+        _cache.invalidate('search')
         return ticket
-    
+
     @tool("Update a Jira ticket")
     def update_ticket(ticket_id, summary, description):
         """Useful to update a Jira ticket"""
-        jira_server = os.getenv('JIRA_SERVER')
-        jira_email = os.getenv('JIRA_EMAIL')
-        jira_api_key = os.getenv('JIRA_API_KEY')
-        jira = JIRA(server=jira_server, basic_auth=(jira_email, jira_api_key))
-        ticket = jira.issue(ticket_id)
-        ticket.update(summary=summary, description=description)
-        return ticket
\ No newline at end of file
+        return update_issue(ticket_id, summary, description)
+
+    @tool("Update several Jira tickets")
+    def update_tickets(updates):
+        """Useful to update many Jira tickets at once. Input is a JSON list of
+        objects with ticket_id, summary and description."""
+        if isinstance(updates, str):
+            updates = json.loads(updates)
+        # Updates share the pooled session and run a few at a time
+        with ThreadPoolExecutor(max_workers=min(get_jira_tools_config()['pool_size'], max(1, len(updates)))) as executor:
+            futures = {
+                update['ticket_id']: executor.submit(update_issue, update['ticket_id'], update['summary'], update['description'])
+                for update in updates
+            }
+        results = {}
+        for ticket_id, future in futures.items():
+            try:
+                future.result()
+                results[ticket_id] = 'updated'
+            except Exception as e:
+                results[ticket_id] = f'failed: {e}'
+        return results
@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+from .config import get_answer_cache_config
+from .stores import read_index_version
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache():
+    """Answers to standalone questions, matched by embedding similarity.
+
+    Entries live in SQLite next to the database; their normalised question
+    vectors are also held as one numpy matrix so a lookup is a single
+    matrix-vector product. Entries from another index version are dropped on
+    open, and the least recently used are evicted past max_entries.
+    """
+
+    def __init__(self, path, version, threshold=0.95, max_entries=2000):
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS answers ('
+            'id INTEGER PRIMARY KEY, version TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, '
+            'sources TEXT NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('DELETE FROM answers WHERE version != ?', (version,))
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute('SELECT id, vector FROM answers').fetchall()
+        self._ids = [row[0] for row in rows]
+        self._vectors = np.array([np.frombuffer(row[1], dtype=np.float32) for row in rows], dtype=np.float32)
+
+    def lookup(self, vector):
+        """The closest cached entry as a dict, or None below the threshold."""
+        with self._lock:
+            if not self._ids:
+                self.stats['misses'] += 1
+                return None
+
+            similarity = self._vectors @ _normalize(vector)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                self.stats['misses'] += 1
+                return None
+
+            entry_id = self._ids[best]
+            row = self._conn.execute(
+                'SELECT question, answer, sources FROM answers WHERE id = ?', (entry_id,)
+            ).fetchone()
+            if row is None:
+                # Evicted or invalidated by another process sharing the file
+                del self._ids[best]
+                self._vectors = np.delete(self._vectors, best, axis=0)
+                self.stats['misses'] += 1
+                return None
+
+            question, answer, sources = row
+            self._conn.execute('UPDATE answers SET last_used = ? WHERE id = ?', (int(time.time()), entry_id))
+            self._conn.commit()
+            self.stats['hits'] += 1
+
+        return {
+            'question': question,
+            'answer': answer,
+            'source_documents': [Document(page_content=content, metadata=metadata) for content, metadata in json.loads(sources)],
+            'similarity': float(similarity[best]),
+        }
+
+    def put(self, question, vector, answer, documents):
+        vector = _normalize(vector)
+        sources = json.dumps([(doc.page_content, doc.metadata) for doc in documents], default=str)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO answers (version, question, answer, sources, vector, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                (self.version, question, answer, sources, vector.tobytes(), int(time.time()))
+            )
+            self._conn.commit()
+
+            [count] = self._conn.execute('SELECT COUNT(*) FROM answers').fetchone()
+            if count > self.max_entries:
+                # Evict down to 90% so the matrix is not rebuilt on every insert
+                excess = count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    'DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)', (excess,)
+                )
+                self._conn.commit()
+                self._load()
+            else:
+                [entry_id] = self._conn.execute('SELECT last_insert_rowid()').fetchone()
+                self._ids.append(entry_id)
+                self._vectors = np.vstack([self._vectors.reshape(-1, len(vector)), vector[None, :]])
+
+
+def open_answer_cache(db_path):
+    """A SemanticAnswerCache for the database at db_path, or None when disabled."""
+    config = get_answer_cache_config()
+    if not config['enabled']:
+        return None
+    return SemanticAnswerCache(
+        config['path'],
+        read_index_version(db_path),
+        threshold=config['threshold'],
+        max_entries=config['max_entries'],
+    )
@@ -0,0 +1,144 @@
+import json
+import os
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from .tokens import count_tokens
+
+
+class TokenBucket():
+    """Tokens-per-minute budget shared by concurrent tasks.
+
+    The bucket refills continuously up to one minute's budget; acquire blocks
+    until the requested tokens are available. A request larger than the whole
+    budget waits for a full bucket rather than forever.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchTask():
+    """One question whose answer is written to output_path."""
+
+    def __init__(self, name, question, output_path):
+        self.name = name
+        self.question = question
+        self.output_path = Path(output_path)
+
+    def is_done(self):
+        return self.output_path.exists() and self.output_path.stat().st_size > 0
+
+
+class BatchRunner():
+    """Runs BatchTasks concurrently, each through its own QA chain.
+
+    make_qa is called once per task so every task has a fresh memory and
+    tasks cannot see each other's conversation. Each attempt first takes its
+    estimated tokens (the question plus context_tokens for the retrieved
+    documents and answer) from a shared TokenBucket. Failed attempts are
+    retried with exponential backoff and jitter. Answers are written to a
+    temporary file and renamed, so an interrupted run never leaves a partial
+    file that a resumed run would skip.
+    """
+
+    def __init__(self, make_qa, max_workers=4, tokens_per_minute=200000, context_tokens=12000, max_retries=4, backoff=2.0):
+        self.make_qa = make_qa
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.context_tokens = context_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _write(self, task, answer):
+        task.output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = task.output_path.with_name(task.output_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.writelines(answer)
+        os.replace(tmp_path, task.output_path)
+
+    def _run(self, task):
+        started = time.perf_counter()
+        error = None
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                self.bucket.acquire(count_tokens(task.question) + self.context_tokens)
+                [qa, _] = self.make_qa()
+                result = qa.invoke(task.question)
+                self._write(task, result['answer'])
+                return {'status': 'done', 'attempts': attempt, 'seconds': time.perf_counter() - started}
+            except Exception as e:
+                error = e
+                if attempt <= self.max_retries:
+                    time.sleep(self.backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+        return {
+            'status': 'failed',
+            'attempts': self.max_retries + 1,
+            'seconds': time.perf_counter() - started,
+            'error': f'{type(error).__name__}: {error}',
+        }
+
+    def run(self, tasks, on_done=None):
+        """Run the tasks not already done, returning a result per task name.
+
+        on_done(task, result) is called from the calling thread as each task
+        finishes.
+        """
+        results = {}
+        pending = []
+        for task in tasks:
+            if task.is_done():
+                results[task.name] = {'status': 'skipped', 'output': str(task.output_path)}
+            else:
+                pending.append(task)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._run, task): task for task in pending}
+            for future in as_completed(futures):
+                task = futures[future]
+                result = {**future.result(), 'output': str(task.output_path)}
+                results[task.name] = result
+                if on_done is not None:
+                    on_done(task, result)
+        return results
+
+
+def write_report(path, results, started):
+    """Write a JSON report of a batch run, with counts per status."""
+    counts = {}
+    for result in results.values():
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'seconds': time.time() - started,
+        'counts': counts,
+        'tasks': results,
+    }
+    path = Path(path)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+    return report
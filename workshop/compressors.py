@@ -0,0 +1,93 @@
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from .shards import ShardedFAISS
+
+
+def document_positions(store, ids):
+    """Index positions of docstore ids in a FAISS store, skipping unknown ids."""
+    mapping = store.index_to_docstore_id
+    if hasattr(mapping, 'positions'):
+        return mapping.positions(ids)
+
+    # In-memory mapping: invert it once and keep the result on the store
+    inverse = getattr(store, '_positions_by_id', None)
+    if inverse is None or len(inverse) != len(mapping):
+        inverse = {doc_id: position for position, doc_id in mapping.items()}
+        store._positions_by_id = inverse
+    return {doc_id: inverse[doc_id] for doc_id in ids if doc_id in inverse}
+
+
+def stored_vectors(store, ids):
+    """Vectors already in the index for the given docstore ids, by id.
+
+    A ShardedFAISS looks each id up in every shard, as results from any
+    shard can be mixed together.
+    """
+    if isinstance(store, ShardedFAISS):
+        found = {}
+        for shard in store.shards.values():
+            remaining = [doc_id for doc_id in ids if doc_id not in found]
+            if not remaining:
+                break
+            found.update(stored_vectors(shard, remaining))
+        return found
+
+    positions = document_positions(store, ids)
+    if not positions:
+        return {}
+    found_ids = list(positions)
+    vectors = store.index.reconstruct_batch(np.array([positions[i] for i in found_ids], dtype=np.int64))
+    return dict(zip(found_ids, vectors))
+
+
+class StoredVectorFilter(BaseDocumentCompressor):
+    """Drops documents less similar to the query than similarity_threshold.
+
+    A drop-in for EmbeddingsFilter that reads document vectors back out of
+    the FAISS index instead of embedding every retrieved document again, and
+    reuses the query vector the retriever computed (through
+    MemoizedQueryEmbeddings), so filtering is a local numpy operation.
+    Documents without a stored vector are embedded as before.
+    """
+
+    store: Any
+    similarity_threshold: Optional[float] = None
+    k: Optional[int] = None
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+
+        ids = [doc.metadata.get('chunk_id') for doc in documents]
+        found = stored_vectors(self.store, [doc_id for doc_id in ids if doc_id is not None])
+        vectors = [found.get(doc_id) for doc_id in ids]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.store.embeddings.embed_documents([documents[i].page_content for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+
+        vectors = np.array(vectors, dtype=np.float32)
+        query_vector = np.asarray(self.store.embeddings.embed_query(query), dtype=np.float32)
+
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+        similarity = vectors @ query_vector / np.where(norms == 0, 1, norms)
+
+        order = np.argsort(similarity)[::-1]
+        if self.k is not None:
+            order = order[:self.k]
+        if self.similarity_threshold is not None:
+            order = [i for i in order if similarity[i] > self.similarity_threshold]
+        return [documents[i] for i in order]
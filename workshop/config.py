@@ -31,9 +31,96 @@ output_path = os.getenv('CODEGEN_OUTPUT_PATH')
 temperature = os.getenv('QUERY_TEMPERATURE', 0.7)
 similarity_threshold = os.getenv('SIMILARITY_THRESHOLD', 0.7)
 
+loader_workers = int(os.getenv('LOADER_WORKERS', 8))
+batch_size = int(os.getenv('BUILD_BATCH_SIZE', 256))
+splitter_workers = int(os.getenv('SPLITTER_WORKERS') or os.cpu_count() or 1)
+chunk_length_mode = os.getenv('CHUNK_LENGTH_MODE', 'characters')
+chunk_size = int(os.getenv('CHUNK_SIZE') or (1500 if chunk_length_mode == 'tokens' else 6000))
+chunk_overlap = int(os.getenv('CHUNK_OVERLAP') or (50 if chunk_length_mode == 'tokens' else 200))
+chunk_encoding = os.getenv('CHUNK_ENCODING', 'cl100k_base')
+chunk_max_tokens = int(os.getenv('CHUNK_MAX_TOKENS', 8191))
+skip_generated = os.getenv('SKIP_GENERATED', 'true').lower() == 'true'
+dedup_chunks = os.getenv('DEDUP_CHUNKS', 'true').lower() == 'true'
+dedup_threshold = float(os.getenv('DEDUP_THRESHOLD', 0.9))
+php_span_cache_path = os.getenv('PHP_SPAN_CACHE_PATH') or os.path.join(os.path.dirname(os.path.normpath(database_path)), 'php_spans.sqlite')
+
+embeddings_engine = os.getenv('EMBEDDINGS_ENGINE', 'concurrent')
+embeddings_concurrency = int(os.getenv('EMBEDDINGS_CONCURRENCY', 4))
+embeddings_max_retries = int(os.getenv('EMBEDDINGS_MAX_RETRIES', 6))
+embeddings_max_batch_items = os.getenv('EMBEDDINGS_MAX_BATCH_ITEMS')
+embeddings_max_batch_tokens = os.getenv('EMBEDDINGS_MAX_BATCH_TOKENS')
+
+embeddings_cache = os.getenv('EMBEDDINGS_CACHE', 'true').lower() == 'true'
+embeddings_cache_path = os.getenv('EMBEDDINGS_CACHE_PATH') or os.path.join(os.path.dirname(os.path.normpath(database_path)), 'embeddings_cache.sqlite')
+embeddings_cache_max_entries = int(os.getenv('EMBEDDINGS_CACHE_MAX_ENTRIES', 200000))
+
+index_type = os.getenv('INDEX_TYPE', 'flat')
+index_nlist = int(os.getenv('INDEX_NLIST', 0))
+index_nprobe = int(os.getenv('INDEX_NPROBE', 16))
+index_pq_m = int(os.getenv('INDEX_PQ_M', 64))
+index_pq_nbits = int(os.getenv('INDEX_PQ_NBITS', 8))
+index_hnsw_m = int(os.getenv('INDEX_HNSW_M', 32))
+index_ef_construction = int(os.getenv('INDEX_EF_CONSTRUCTION', 200))
+index_ef_search = int(os.getenv('INDEX_EF_SEARCH', 128))
+index_train_size = int(os.getenv('INDEX_TRAIN_SIZE', 100000))
+
+hybrid_search = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+hybrid_lexical_k = int(os.getenv('HYBRID_LEXICAL_K', 50))
+hybrid_rrf_k = int(os.getenv('HYBRID_RRF_K', 60))
+
+query_cache = os.getenv('QUERY_CACHE', 'true').lower() == 'true'
+query_cache_path = os.getenv('QUERY_CACHE_PATH') or os.path.join(os.path.dirname(os.path.normpath(database_path)), 'query_cache.sqlite')
+query_cache_max_entries = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 20000))
+query_cache_memory_entries = int(os.getenv('QUERY_CACHE_MEMORY_ENTRIES', 256))
+
+answer_cache = os.getenv('ANSWER_CACHE', 'true').lower() == 'true'
+answer_cache_path = os.getenv('ANSWER_CACHE_PATH') or os.path.join(database_path, 'answer_cache.sqlite')
+answer_cache_threshold = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+answer_cache_max_entries = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 2000))
+
+memory_mode = os.getenv('MEMORY_MODE', 'lazy_summary')
+memory_max_tokens = int(os.getenv('MEMORY_MAX_TOKENS', 2000))
+skip_first_condense = os.getenv('SKIP_FIRST_CONDENSE', 'true').lower() == 'true'
+
+streaming = os.getenv('STREAMING', 'true').lower() == 'true'
+
+batch_concurrency = int(os.getenv('BATCH_CONCURRENCY', 4))
+batch_tokens_per_minute = int(os.getenv('BATCH_TOKENS_PER_MINUTE', 200000))
+batch_context_tokens = int(os.getenv('BATCH_CONTEXT_TOKENS', 12000))
+batch_max_retries = int(os.getenv('BATCH_MAX_RETRIES', 4))
+
+http_max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+http_max_keepalive = int(os.getenv('HTTP_MAX_KEEPALIVE', 20))
+http_keepalive_expiry = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 60))
+http_timeout = float(os.getenv('HTTP_TIMEOUT', 120))
+http_connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+
+crew_parallel = os.getenv('CREW_PARALLEL', 'false').lower() == 'true'
+crew_max_workers = int(os.getenv('CREW_MAX_WORKERS', 3))
+crew_cache = os.getenv('CREW_CACHE', 'true').lower() == 'true'
+crew_cache_path = os.getenv('CREW_CACHE_PATH') or os.path.join(os.path.dirname(os.path.normpath(database_path)), 'crew_cache.sqlite')
+crew_cache_ttl = int(os.getenv('CREW_CACHE_TTL', 86400))
+
+service_host = os.getenv('SERVICE_HOST', '127.0.0.1')
+service_port = int(os.getenv('SERVICE_PORT', 8000))
+service_url = os.getenv('SERVICE_URL') or f'http://{service_host}:{service_port}'
+service_session_ttl = int(os.getenv('SERVICE_SESSION_TTL', 3600))
+service_reload_interval = int(os.getenv('SERVICE_RELOAD_INTERVAL', 30))
+
+# Request limits of each provider's embeddings API. Anthropic and Groq have no
+# embeddings of their own and use the Azure deployment.
+embeddings_limits = {
+    'azure': {'max_batch_items': 16, 'max_batch_tokens': 100000},
+    'anthropic': {'max_batch_items': 16, 'max_batch_tokens': 100000},
+    'groq': {'max_batch_items': 16, 'max_batch_tokens': 100000},
+    'together': {'max_batch_items': 32, 'max_batch_tokens': 100000},
+}
+
 jira_username = os.getenv('JIRA_EMAIL')
 jira_instance_url = os.getenv('JIRA_SERVER')
 jira_api_token = os.getenv('JIRA_API_KEY')
+jira_cache_ttl = float(os.getenv('JIRA_CACHE_TTL', 60))
+jira_pool_size = int(os.getenv('JIRA_POOL_SIZE', 10))
 
 github_app_id = os.getenv('GITHUB_APP_ID')
 github_app_private_key = os.getenv('GITHUB_APP_PRIVATE_KEY')
@@ -101,6 +188,132 @@ def get_similarity_threshold():
 def get_db_path():
     return database_path
 
+def get_loader_workers():
+    return loader_workers
+
+def get_batch_size():
+    return batch_size
+
+def get_splitter_workers():
+    return splitter_workers
+
+def get_chunk_config():
+    return {
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'length_mode': chunk_length_mode,
+        'encoding_name': chunk_encoding,
+        'max_tokens': chunk_max_tokens,
+    }
+
+def get_dedup_config():
+    return {
+        'skip_generated': skip_generated,
+        'dedup_chunks': dedup_chunks,
+        'threshold': dedup_threshold,
+    }
+
+def get_php_span_cache_path():
+    return php_span_cache_path
+
+def get_index_config():
+    return {
+        'type': index_type,
+        'nlist': index_nlist,
+        'nprobe': index_nprobe,
+        'pq_m': index_pq_m,
+        'pq_nbits': index_pq_nbits,
+        'hnsw_m': index_hnsw_m,
+        'ef_construction': index_ef_construction,
+        'ef_search': index_ef_search,
+        'train_size': index_train_size,
+    }
+
+def get_embeddings_cache_config():
+    return {
+        'enabled': embeddings_cache,
+        'path': embeddings_cache_path,
+        'max_entries': embeddings_cache_max_entries,
+    }
+
+def get_embeddings_engine_config():
+    limits = embeddings_limits.get(provider, embeddings_limits['azure'])
+    return {
+        'engine': embeddings_engine,
+        'max_batch_items': int(embeddings_max_batch_items or limits['max_batch_items']),
+        'max_batch_tokens': int(embeddings_max_batch_tokens or limits['max_batch_tokens']),
+        'max_concurrency': embeddings_concurrency,
+        'max_retries': embeddings_max_retries,
+    }
+
+def get_hybrid_config():
+    return {
+        'enabled': hybrid_search,
+        'lexical_k': hybrid_lexical_k,
+        'rrf_k': hybrid_rrf_k,
+    }
+
+def get_query_cache_config():
+    return {
+        'enabled': query_cache,
+        'path': query_cache_path,
+        'max_entries': query_cache_max_entries,
+        'memory_entries': query_cache_memory_entries,
+    }
+
+def get_answer_cache_config():
+    return {
+        'enabled': answer_cache,
+        'path': answer_cache_path,
+        'threshold': answer_cache_threshold,
+        'max_entries': answer_cache_max_entries,
+    }
+
+def get_memory_config():
+    return {
+        'mode': memory_mode,
+        'max_tokens': memory_max_tokens,
+        'skip_first_condense': skip_first_condense,
+    }
+
+def get_streaming():
+    return streaming
+
+def get_batch_config():
+    return {
+        'max_workers': batch_concurrency,
+        'tokens_per_minute': batch_tokens_per_minute,
+        'context_tokens': batch_context_tokens,
+        'max_retries': batch_max_retries,
+    }
+
+def get_http_config():
+    return {
+        'max_connections': http_max_connections,
+        'max_keepalive_connections': http_max_keepalive,
+        'keepalive_expiry': http_keepalive_expiry,
+        'timeout': http_timeout,
+        'connect_timeout': http_connect_timeout,
+    }
+
+def get_crew_config():
+    return {
+        'parallel': crew_parallel,
+        'max_workers': crew_max_workers,
+        'cache': crew_cache,
+        'cache_path': crew_cache_path,
+        'cache_ttl': crew_cache_ttl,
+    }
+
+def get_service_config():
+    return {
+        'host': service_host,
+        'port': service_port,
+        'url': service_url,
+        'session_ttl': service_session_ttl,
+        'reload_interval': service_reload_interval,
+    }
+
 def get_jira_config():
     return {
         'jira_username': jira_username,
@@ -108,6 +321,12 @@ def get_jira_config():
         'jira_api_token': jira_api_token
     }
 
+def get_jira_tools_config():
+    return {
+        'cache_ttl': jira_cache_ttl,
+        'pool_size': jira_pool_size,
+    }
+
 def get_github_config():
     return {
         'github_app_id': github_app_id,
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from .config import get_crew_config
+
+# Tools whose results only depend on their input and the state of Jira and
+# GitHub, by toolkit mode or tool name. Anything else may write, so it always
+# runs, and clears the cached results it may have made stale.
+READ_ONLY_TOOLS = {
+    'jql', 'get_projects',
+    'get_issues', 'get_issue', 'list_open_pull_requests', 'get_pull_request',
+    'list_pull_request_files', 'list_files_in_main_branch', 'list_branches_in_repo',
+    'search_issues_and_prs', 'search_code', 'get_latest_release', 'get_releases', 'get_release',
+}
+
+
+class CrewCache():
+    """Read-only tool results and task outputs of crew runs, keyed by their inputs.
+
+    Entries are kept in SQLite for ttl seconds, so a crew rerun after a
+    failure reuses the lookups and tasks that already completed instead of
+    repeating them, while a run the next day starts fresh.
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.ttl = ttl
+        self.stats = {}
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, created INTEGER NOT NULL)'
+        )
+        self._conn.execute('DELETE FROM results WHERE created < ?', (int(time.time()) - ttl,))
+        self._conn.commit()
+
+    @staticmethod
+    def key(kind, *parts):
+        return hashlib.sha256(json.dumps([kind, *parts], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, kind, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM results WHERE key = ? AND created >= ?', (key, int(time.time()) - self.ttl)
+            ).fetchone()
+            stats = self.stats.setdefault(kind, {'hits': 0, 'misses': 0})
+            stats['hits' if row else 'misses'] += 1
+        return row[0] if row else None
+
+    def put(self, kind, key, value):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, kind, value, created) VALUES (?, ?, ?, ?)',
+                (key, kind, value, int(time.time()))
+            )
+            self._conn.commit()
+        return value
+
+    def invalidate(self, kind):
+        with self._lock:
+            self._conn.execute('DELETE FROM results WHERE kind = ?', (kind,))
+            self._conn.commit()
+
+
+def is_read_only(tool):
+    return getattr(tool, 'mode', None) in READ_ONLY_TOOLS or tool.name in READ_ONLY_TOOLS
+
+
+class CachedTool(BaseTool):
+    """Wraps a tool so results of read-only tools for the same input come
+    from a CrewCache, and other tools invalidate them."""
+
+    tool: Any
+    cache: Any
+
+    def _run(self, *args, run_manager=None, **kwargs):
+        tool_input = kwargs if kwargs else (args[0] if args else '')
+        if not is_read_only(self.tool):
+            # Writes run every time; reads cached before them may be stale
+            try:
+                return self.tool.run(tool_input)
+            finally:
+                self.cache.invalidate('tool')
+
+        key = CrewCache.key('tool', self.tool.name, tool_input)
+        result = self.cache.get('tool', key)
+        if result is None:
+            result = self.cache.put('tool', key, str(self.tool.run(tool_input)))
+        return result
+
+
+def cached_tools(tools, cache):
+    """The tools wrapped in CachedTool, or unchanged without a cache."""
+    if cache is None:
+        return tools
+    return [
+        tool if isinstance(tool, CachedTool) else CachedTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            tool=tool,
+            cache=cache,
+        )
+        for tool in tools
+    ]
+
+
+def open_crew_cache():
+    """A CrewCache at CREW_CACHE_PATH, or None when disabled."""
+    config = get_crew_config()
+    if not config['cache']:
+        return None
+    return CrewCache(config['cache_path'], ttl=config['cache_ttl'])
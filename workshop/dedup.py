@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+import zlib
+
+import numpy as np
+
+GENERATED_SUFFIXES = (
+    '.min.js', '.min.css', '.map', '.bundle.js', '.designer.cs', '.g.cs', '.g.i.cs',
+    '.generated.cs', 'modelsnapshot.cs', 'package-lock.json', 'yarn.lock', 'composer.lock',
+)
+GENERATED_MARKERS = (
+    '<auto-generated', '@generated', 'this code was generated by a tool',
+    'code generated by', 'do not edit', 'autogenerated file',
+)
+
+
+def is_generated(path, text):
+    """Reason a file looks generated or minified, or None if it looks hand written."""
+    name = os.path.basename(str(path)).lower()
+    if name.endswith(GENERATED_SUFFIXES):
+        return 'suffix'
+
+    head = text[:2048].lower()
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return 'marker'
+
+    # Minified code: long text packed into very few, very long lines
+    if len(text) > 2000:
+        lines = text.count('\n') + 1
+        if len(text) / lines > 300 or max(len(line) for line in text.split('\n')) > 5000:
+            return 'minified'
+
+    return None
+
+
+def filter_generated(documents, counts):
+    """Drop generated and minified documents, counting them by reason."""
+    for document in documents:
+        reason = is_generated(document.metadata.get('source', ''), document.page_content)
+        if reason is None:
+            yield document
+        else:
+            counts[reason] = counts.get(reason, 0) + 1
+
+
+_WORD = re.compile(r'\w+')
+_SPACE = re.compile(r'\s+')
+_PRIME = np.uint64(4294967311)
+
+
+def content_id(text):
+    """Chunk id derived from whitespace-normalised text.
+
+    Operators and punctuation are part of the code, so only whitespace is
+    normalised; chunks with the same id are exact duplicates.
+    """
+    return hashlib.sha1(_SPACE.sub(' ', text).strip().encode('utf-8')).hexdigest()
+
+
+class ChunkDeduplicator():
+    """Drops exact and near-duplicate chunks.
+
+    Exact duplicates are found across files by content id: a copy of a chunk
+    that is already indexed, or kept earlier in the build, is not embedded
+    again but shares that chunk's id. The manifest lists the id for every
+    file holding a copy, and only deletes the vector once none of them is
+    left. The shared chunk keeps the metadata of the file it was first
+    embedded from.
+
+    Near duplicates use MinHash signatures over word shingles with LSH banding
+    to find candidates, which are dropped when their estimated Jaccard
+    similarity is at least threshold. They have no chunk of their own to
+    share, so they are only compared with earlier chunks of the same file,
+    which is removed and re-split as a whole.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, shingle_size=5, indexed_ids=()):
+        if num_perm % bands != 0:
+            raise ValueError('num_perm must be divisible by bands')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Coefficients are kept below 2**31 so a * x + b cannot overflow uint64
+        rng = np.random.default_rng(0)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+        self._ids = set(indexed_ids)
+        self._scope = None
+        self.stats = {'exact': 0, 'near': 0}
+        self.reset()
+
+    def reset(self, scope=None):
+        """Forget the near-duplicate candidates and start comparing within scope."""
+        self._scope = scope
+        self._signatures = []
+        self._buckets = {}
+
+    def _signature(self, words):
+        shingles = {
+            zlib.crc32(' '.join(words[i:i + self.shingle_size]).encode('utf-8'))
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((np.outer(x, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def _is_near_duplicate(self, text, scope):
+        if scope != self._scope:
+            self.reset(scope)
+
+        words = _WORD.findall(text)
+        if len(words) < self.shingle_size * 4:
+            return False
+
+        signature = self._signature(words)
+        keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+        candidates = {i for key in keys for i in self._buckets.get(key, ())}
+        for i in candidates:
+            if np.mean(self._signatures[i] == signature) >= self.threshold:
+                return True
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(index)
+        return False
+
+    def check(self, text, scope=None):
+        """The chunk's content id and 'exact', 'near' or None for a new chunk."""
+        chunk_id = content_id(text)
+        if chunk_id in self._ids:
+            self.stats['exact'] += 1
+            return chunk_id, 'exact'
+        if self._is_near_duplicate(text, scope):
+            self.stats['near'] += 1
+            return chunk_id, 'near'
+        self._ids.add(chunk_id)
+        return chunk_id, None
+
+    def is_duplicate(self, text, scope=None):
+        return self.check(text, scope)[1] is not None
+
+    def filter(self, texts, ids_by_path):
+        """Drop duplicate chunks and give the others their content id.
+
+        Like assign_chunk_ids, records the ids per source file, including
+        the ids of the chunks exact duplicates share. Chunks arrive in
+        document order, so near duplicates are compared per file.
+        """
+        for text in texts:
+            source = text.metadata.get('source')
+            chunk_id, duplicate = self.check(text.page_content, source)
+            if duplicate != 'near':
+                ids_by_path.setdefault(source, []).append(chunk_id)
+            if duplicate is None:
+                text.metadata['chunk_id'] = chunk_id
+                yield text
@@ -0,0 +1,175 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+class EmbeddingCache():
+    """SQLite store of embedding vectors keyed by hash of model name and text.
+
+    The least recently used entries are evicted once max_entries is exceeded.
+    WAL mode lets several builds (e.g. one per branch database) share a cache.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[i:i + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+                if rows:
+                    now = int(time.time())
+                    self._conn.executemany(
+                        'UPDATE embeddings SET last_used = ? WHERE key = ?',
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        now = int(time.time())
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        [count] = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+        if count <= self.max_entries:
+            return
+        # Evict down to 90% so eviction does not run on every insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            'DELETE FROM embeddings WHERE key IN '
+            '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)', (excess,)
+        )
+        self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Serves document embeddings from an EmbeddingCache, only sending
+    uncached texts to the wrapped embeddings."""
+
+    def __init__(self, embeddings, cache, namespace):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.namespace = namespace
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _key(self, text):
+        return hashlib.sha256(f'{self.namespace}\0{text}'.encode('utf-8')).hexdigest()
+
+    def _lookup(self, texts):
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+
+        # Identical texts within the batch are only embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        self.stats['hits'] += len(texts) - sum(1 for key in keys if key in missing)
+        self.stats['misses'] += len(missing)
+        return keys, found, missing
+
+    def _store(self, keys, found, missing, vectors):
+        computed = dict(zip(missing.keys(), vectors))
+        if computed:
+            self.cache.put_many(computed.items())
+        found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        keys, found, missing = self._lookup(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._store(keys, found, missing, vectors)
+
+    async def aembed_documents(self, texts):
+        keys, found, missing = self._lookup(texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return self._store(keys, found, missing, vectors)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text):
+        return await self.embeddings.aembed_query(text)
+
+
+class MemoizedQueryEmbeddings(Embeddings):
+    """Remembers the last few query embeddings, so a retriever and the
+    compressor filtering its results embed each question only once."""
+
+    def __init__(self, embeddings, maxsize=8):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, text):
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+            return vector
+
+    def _put(self, text, vector):
+        with self._lock:
+            self._queries[text] = vector
+            self._queries.move_to_end(text)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self._get(text)
+        if vector is None:
+            vector = self._put(text, self.embeddings.embed_query(text))
+        return vector
+
+    async def aembed_query(self, text):
+        vector = self._get(text)
+        if vector is None:
+            vector = self._put(text, await self.embeddings.aembed_query(text))
+        return vector
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from .tokens import count_tokens_batch
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def get_embeddings_loop():
+    """The event loop every embeddings request runs on, started once per process.
+
+    Async HTTP clients keep their pooled connections bound to the loop they
+    were opened on, so running every request on one long-lived loop lets the
+    provider client reuse connections between calls instead of opening new
+    ones on a fresh loop each time.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='embeddings-loop', daemon=True).start()
+        return _loop
+
+
+def _status_code(exc):
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status
+
+
+def _retry_after(exc):
+    """Seconds to wait from a Retry-After style header, if the error carries one."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+class AdaptiveLimiter():
+    """Concurrency limit that halves on throttling and creeps back up on success."""
+
+    def __init__(self, maximum, minimum=1, increase_after=8, limit=None, paused_until=0):
+        self.limit = limit or maximum
+        self.maximum = maximum
+        self.minimum = minimum
+        self.increase_after = increase_after
+        self.in_flight = 0
+        self.paused_until = paused_until
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, throttled=False, retry_after=None):
+        async with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.maximum:
+                    self._successes = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """Embeds documents with several provider requests in flight.
+
+    Texts are packed into requests of at most max_batch_items inputs and
+    max_batch_tokens tokens. Up to max_concurrency requests run at once; a 429
+    halves the concurrency and honours Retry-After, and failed requests are
+    retried with backoff so one bad batch does not abort a build.
+
+    Tokens are counted with token_counter, which takes a list of texts and
+    returns their counts; by default the embedding model's tiktoken encoding.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        max_batch_items=16,
+        max_batch_tokens=100000,
+        max_concurrency=4,
+        max_retries=6,
+        backoff=1.0,
+        token_counter=count_tokens_batch
+    ):
+        self.embeddings = embeddings
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.token_counter = token_counter
+        self.stats = {'requests': 0, 'throttled': 0, 'retries': 0}
+        # Carried between calls so throttling persists across build batches
+        self._limit = max_concurrency
+        self._paused_until = 0
+
+    def _batches(self, texts):
+        """Pack text indexes into batches within the item and token limits."""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for i, tokens in enumerate(self.token_counter(texts)):
+            if batch and (len(batch) >= self.max_batch_items or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _embed_batch(self, limiter, texts):
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            try:
+                self.stats['requests'] += 1
+                result = await self.embeddings.aembed_documents(texts)
+            except Exception as e:
+                status = _status_code(e)
+                if status is not None and 400 <= status < 500 and status not in (408, 409, 429):
+                    await limiter.release()
+                    raise
+                if attempt == self.max_retries:
+                    await limiter.release()
+                    raise
+
+                throttled = status == 429
+                retry_after = _retry_after(e)
+                if throttled:
+                    self.stats['throttled'] += 1
+                self.stats['retries'] += 1
+                await limiter.release(throttled=throttled, retry_after=retry_after)
+                await asyncio.sleep(retry_after or self.backoff * (2 ** attempt) * (0.5 + random.random()))
+                continue
+
+            await limiter.release()
+            return result
+
+    async def _aembed_documents(self, texts):
+        limiter = AdaptiveLimiter(self.max_concurrency, limit=self._limit, paused_until=self._paused_until)
+        batches = self._batches(texts)
+        try:
+            results = await asyncio.gather(*[
+                self._embed_batch(limiter, [texts[i] for i in batch]) for batch in batches
+            ])
+        finally:
+            self._limit = limiter.limit
+            self._paused_until = limiter.paused_until
+
+        vectors = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
+    async def aembed_documents(self, texts):
+        loop = get_embeddings_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._aembed_documents(texts)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._aembed_documents(texts), loop))
+
+    def embed_documents(self, texts):
+        return asyncio.run_coroutine_threadsafe(self._aembed_documents(texts), get_embeddings_loop()).result()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
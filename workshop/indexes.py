@@ -0,0 +1,159 @@
+import json
+import math
+import os
+import time
+
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ['flat', 'ivf_flat', 'ivf_pq', 'hnsw']
+ANN_INDEX_FILE = 'index.ann.faiss'
+INDEX_META_FILE = 'index_meta.json'
+
+
+def get_vectors(index):
+    """All vectors held by a flat index, as a float32 array."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def default_nlist(count):
+    """About 4 * sqrt(n) lists, keeping at least 39 training points per list."""
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def ann_index_type(count, cfg):
+    """The index type to build for count vectors.
+
+    PQ training needs at least 2**pq_nbits vectors, so shards too small for
+    the configured IVF-PQ index stay flat, which at that size is as fast.
+    """
+    if cfg['type'] == 'ivf_pq' and count < 2 ** cfg['pq_nbits']:
+        return 'flat'
+    return cfg['type']
+
+
+def build_ann_index(vectors, cfg):
+    """Build an approximate nearest neighbour index for the configured type.
+
+    IVF indexes are trained on a random sample of at most train_size vectors.
+    Vectors are added in order, so positions match the flat index and the
+    docstore mapping is shared between them.
+    """
+    count, dims = vectors.shape
+    index_type = cfg['type']
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dims, cfg['hnsw_m'])
+        index.hnsw.efConstruction = cfg['ef_construction']
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        # Training needs at least one vector per list
+        nlist = min(cfg['nlist'] or default_nlist(count), count)
+        quantizer = faiss.IndexFlatL2(dims)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dims, nlist)
+        else:
+            if dims % cfg['pq_m'] != 0:
+                raise ValueError(f"INDEX_PQ_M ({cfg['pq_m']}) must divide the embedding dimensions ({dims})")
+            index = faiss.IndexIVFPQ(quantizer, dims, nlist, cfg['pq_m'], cfg['pq_nbits'])
+    else:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(count, min(count, cfg['train_size']), replace=False)]
+        index.train(sample)
+
+    index.add(vectors)
+
+    if index_type != 'hnsw':
+        # Needed by reconstruct(), which MMR search uses
+        index.make_direct_map()
+
+    return index
+
+
+def apply_search_params(index, meta):
+    """Set nprobe/efSearch on an index from its saved metadata."""
+    index_type = meta.get('type', 'flat')
+    if index_type in ('ivf_flat', 'ivf_pq'):
+        faiss.extract_index_ivf(index).nprobe = meta['nprobe']
+    elif index_type == 'hnsw':
+        index.hnsw.efSearch = meta['ef_search']
+
+
+def search_param_name(index_type):
+    return 'ef_search' if index_type == 'hnsw' else 'nprobe'
+
+
+def save_index_meta(path, meta):
+    path = Path(path, INDEX_META_FILE)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_index_meta(path):
+    meta_path = Path(path, INDEX_META_FILE)
+    if not meta_path.exists():
+        return {'type': 'flat'}
+    with open(meta_path, 'r') as f:
+        return json.load(f)
+
+
+def make_index_meta(cfg, index, index_type=None):
+    """Metadata saved next to an index; the config is kept to detect changes."""
+    return {
+        'type': index_type or cfg['type'],
+        'nprobe': cfg['nprobe'],
+        'ef_search': cfg['ef_search'],
+        'ntotal': index.ntotal,
+        'dims': index.d,
+        'config': cfg,
+    }
+
+
+def evaluate_index(vectors, flat_index, ann_index, meta, k=20, queries=200, settings=None):
+    """Measure recall@k and latency of an ANN index against the flat index.
+
+    A sample of stored vectors is used as queries, and each query's own
+    vector is left out of both result lists so the exact self-match does not
+    inflate recall. Returns one row per search setting with the setting,
+    recall and mean milliseconds per query.
+    """
+    index_type = meta['type']
+    param = search_param_name(index_type)
+    if settings is None:
+        settings = [16, 32, 64, 128, 256] if index_type == 'hnsw' else [1, 4, 8, 16, 32, 64]
+
+    rng = np.random.default_rng(1)
+    count = flat_index.ntotal
+    positions = rng.choice(count, min(count, queries), replace=False)
+    sample = vectors[positions]
+    k = min(k, count - 1)
+    if k < 1:
+        return []
+
+    def without_self(results):
+        return [[i for i in row if i != position and i != -1][:k] for position, row in zip(positions, results)]
+
+    start = time.perf_counter()
+    _, truth = flat_index.search(sample, k + 1)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(sample)
+    truth = without_self(truth)
+    total = sum(len(t) for t in truth)
+
+    rows = [('flat', 1.0, flat_ms)]
+    for setting in settings:
+        apply_search_params(ann_index, dict(meta, **{param: setting}))
+        start = time.perf_counter()
+        _, found = ann_index.search(sample, k + 1)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth, without_self(found)))
+        rows.append((f'{param}={setting}', hits / total, elapsed_ms))
+
+    apply_search_params(ann_index, meta)
+    return rows
@@ -1,3 +1,9 @@
+import atexit
+import os
+import threading
+
+import httpx
+
 from langchain_together import Together
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import AzureChatOpenAI
@@ -5,7 +11,6 @@ from langchain.chains import ConversationalRetrievalChain
 from langchain_openai import AzureOpenAIEmbeddings
 from langchain_together.embeddings import TogetherEmbeddings
 from langchain_groq import ChatGroq
-from langchain.memory import ConversationSummaryMemory
 from langchain_community.agent_toolkits.jira.toolkit import JiraToolkit
 from langchain_community.utilities.jira import JiraAPIWrapper
 from langchain_community.agent_toolkits.github.toolkit import GitHubToolkit
@@ -14,10 +19,121 @@ from langchain_community.document_transformers import LongContextReorder
 from langchain.retrievers.document_compressors import DocumentCompressorPipeline
 from langchain.retrievers import ContextualCompressionRetriever
 
-from .config import get_provider, openai_deployment, openai_deployment_embeddings, get_groq_api_key, get_groq_chat_model, get_anthropic_api_key, get_anthropic_chat_model, get_together_embeddings, get_together_api_key, get_together_chat_model, get_openai_config, get_query_temperature, get_azure_endpoint, get_api_key, get_api_type, get_api_version, get_jira_config, get_github_config
+from .embeddings import ConcurrentEmbeddings
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .qa import ConversationalQA
+from .memory import get_memory, get_chat_history
+from .config import get_memory_config, get_embeddings_cache_config, get_embeddings_engine_config, get_provider, openai_deployment, openai_deployment_embeddings, get_groq_api_key, get_groq_chat_model, get_anthropic_api_key, get_anthropic_chat_model, get_together_embeddings, get_together_api_key, get_together_chat_model, get_openai_config, get_http_config, get_query_temperature, get_azure_endpoint, get_api_key, get_api_type, get_api_version, get_jira_config, get_jira_tools_config, get_github_config
+
+# Process-wide registry of clients, created once on first use and shared
+# by every caller. A forked process starts with an empty registry, as
+# connections cannot be shared between processes.
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.RLock()
+
+
+def _shared(key, factory):
+    global _clients_pid
+    client = _clients.get(key) if _clients_pid == os.getpid() else None
+    if client is not None:
+        return client
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+        return client
+
+
+def _http_client_args():
+    cfg = get_http_config()
+    return {
+        'limits': httpx.Limits(
+            max_connections=cfg['max_connections'],
+            max_keepalive_connections=cfg['max_keepalive_connections'],
+            keepalive_expiry=cfg['keepalive_expiry'],
+        ),
+        'timeout': httpx.Timeout(cfg['timeout'], connect=cfg['connect_timeout']),
+    }
+
+
+def get_http_client():
+    """The keep-alive connection pool shared by every provider's sync calls."""
+    return _shared('http', lambda: httpx.Client(**_http_client_args()))
+
+
+def get_async_http_client(name='default'):
+    """A keep-alive connection pool for async calls.
+
+    An async client's connections belong to the event loop that opened them,
+    so each name should only be used from one loop: 'embeddings' from the
+    embeddings loop, 'default' from the application's loop.
+    """
+    return _shared(('async_http', name), lambda: httpx.AsyncClient(**_http_client_args()))
+
+
+@atexit.register
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            if isinstance(client, httpx.Client):
+                client.close()
+
 
 def get_embeddings(disallowed_special=(), chunk_size=16):
+    """The configured embeddings, created once per process and settings."""
+    return _shared(
+        ('embeddings', tuple(disallowed_special), chunk_size),
+        lambda: _create_embeddings(disallowed_special=disallowed_special, chunk_size=chunk_size)
+    )
+
+def _create_embeddings(disallowed_special=(), chunk_size=16):
+    embeddings = _get_engine_embeddings(disallowed_special=disallowed_special, chunk_size=chunk_size)
+
+    cache_cfg = get_embeddings_cache_config()
+    if not cache_cfg['enabled']:
+        return embeddings
+
+    cache = EmbeddingCache(cache_cfg['path'], max_entries=cache_cfg['max_entries'])
+    return CachedEmbeddings(embeddings, cache, namespace=_get_embeddings_model_name())
+
+def _get_embeddings_model_name():
+    if get_provider() == 'together':
+        return f'together:{get_together_embeddings()}'
+    return f'azure:{openai_deployment_embeddings}'
+
+def _get_engine_embeddings(disallowed_special=(), chunk_size=16):
+    engine_cfg = get_embeddings_engine_config()
+
+    if engine_cfg['engine'] != 'concurrent':
+        return _get_provider_embeddings(disallowed_special=disallowed_special, chunk_size=chunk_size)
+
+    # One provider call per batch; retries are handled by ConcurrentEmbeddings
+    # so that throttling feeds back into its concurrency limit
+    embeddings = _get_provider_embeddings(
+        disallowed_special=disallowed_special,
+        chunk_size=engine_cfg['max_batch_items'],
+        max_retries=0,
+        async_client_name='embeddings'
+    )
+    return ConcurrentEmbeddings(
+        embeddings,
+        max_batch_items=engine_cfg['max_batch_items'],
+        max_batch_tokens=engine_cfg['max_batch_tokens'],
+        max_concurrency=engine_cfg['max_concurrency'],
+        max_retries=engine_cfg['max_retries']
+    )
+
+def _get_provider_embeddings(disallowed_special=(), chunk_size=16, max_retries=2, async_client_name='default'):
     provider = get_provider()
+    http_clients = {
+        'http_client': get_http_client(),
+        'http_async_client': get_async_http_client(async_client_name),
+    }
     
     if(provider == 'azure'):
         cfg = get_openai_config()
@@ -26,10 +142,12 @@ def get_embeddings(disallowed_special=(), chunk_size=16):
             azure_endpoint=get_azure_endpoint(),
             disallowed_special=disallowed_special, 
             chunk_size=chunk_size, 
+            max_retries=max_retries,
             azure_deployment=openai_deployment_embeddings,
             api_key=get_api_key(),
             openai_api_type=get_api_type(),
-            api_version=get_api_version()
+            api_version=get_api_version(),
+            **http_clients
         )
     elif(provider == 'anthropic'):
         cfg = get_openai_config()
@@ -38,13 +156,15 @@ def get_embeddings(disallowed_special=(), chunk_size=16):
             azure_endpoint=get_azure_endpoint(),
             disallowed_special=disallowed_special, 
             chunk_size=chunk_size, 
+            max_retries=max_retries,
             azure_deployment=openai_deployment_embeddings,
             api_key=get_api_key(),
             openai_api_type=get_api_type(),
-            api_version=get_api_version()
+            api_version=get_api_version(),
+            **http_clients
         )
     elif(provider == 'together'):
-        return TogetherEmbeddings(together_api_key=get_together_api_key(), model=get_together_embeddings())
+        return TogetherEmbeddings(together_api_key=get_together_api_key(), model=get_together_embeddings(), max_retries=max_retries)
     elif(provider == 'groq'):
         cfg = get_openai_config()
     
@@ -52,20 +172,28 @@ def get_embeddings(disallowed_special=(), chunk_size=16):
             azure_endpoint=get_azure_endpoint(),
             disallowed_special=disallowed_special, 
             chunk_size=chunk_size, 
+            max_retries=max_retries,
             azure_deployment=openai_deployment_embeddings,
             api_key=get_api_key(),
             openai_api_type=get_api_type(),
-            api_version=get_api_version()
+            api_version=get_api_version(),
+            **http_clients
         )
 
-def get_qa(retriever, verbose=True):
+def get_qa(retriever, verbose=True, answer_cache=None, embeddings=None, memory=None, streaming=False):
+    """Conversational QA chain, as a ConversationalQA, and its memory.
+
+    With a SemanticAnswerCache (and the embeddings to match questions with)
+    repeated questions are answered from the cache. With streaming the answer
+    LLM streams its tokens to ConversationalQA.astream, while condensing
+    questions and summarising memory use a separate, non-streaming LLM. An
+    existing memory can be passed to carry a conversation over to a new chain.
+    """
     llm = get_llm()
+    answer_llm = get_llm(streaming=True) if streaming else llm
 
-    memory = ConversationSummaryMemory(
-        llm=llm,
-        memory_key="chat_history",
-        return_messages=True
-    )
+    if memory is None:
+        memory = get_memory(llm)
     
     reordering = LongContextReorder()
 
@@ -77,14 +205,29 @@ def get_qa(retriever, verbose=True):
 
     compression_retriever = ContextualCompressionRetriever(base_compressor=pipeline_compressor, base_retriever=retriever)
 
-    return [ConversationalRetrievalChain.from_llm(
-        llm, 
+    qa = ConversationalRetrievalChain.from_llm(
+        answer_llm, 
         retriever=compression_retriever, 
-        memory=memory
-    ), memory]
+        memory=memory,
+        condense_question_llm=llm,
+        return_generated_question=True,
+        get_chat_history=get_chat_history if get_memory_config()['skip_first_condense'] else None
+    )
+    return [ConversationalQA(qa, answer_cache, embeddings), memory]
     
 
-def get_llm():
+def get_llm(streaming=False):
+    """The configured chat model. With streaming the chat providers send
+    tokens to the run's callbacks' on_llm_new_token as they are generated;
+    Together's completion model delivers the whole answer at on_llm_end instead.
+
+    Models are created once per process and shared, so their clients and
+    connections are reused; callbacks are passed per run rather than set on
+    the shared model.
+    """
+    return _shared(('llm', streaming), lambda: _create_llm(streaming=streaming))
+
+def _create_llm(streaming=False):
     provider = get_provider()
     if(provider == 'azure'):
         cfg = get_openai_config()
@@ -93,6 +236,9 @@ def get_llm():
             deployment_name=openai_deployment,
             temperature=get_query_temperature(),
             verbose=True,
+            streaming=streaming,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
             **cfg
     )
     elif(provider == 'anthropic'):
@@ -100,7 +246,8 @@ def get_llm():
             model_name=get_anthropic_chat_model(),
             temperature=get_query_temperature(),
             top_k=1,
-            api_key=get_anthropic_api_key()
+            api_key=get_anthropic_api_key(),
+            streaming=streaming
         )
     elif(provider == 'together'):
         return Together(
@@ -115,15 +262,47 @@ def get_llm():
         return ChatGroq(
             model=get_groq_chat_model(),
             temperature=get_query_temperature(),
-            api_key=get_groq_api_key()
+            api_key=get_groq_api_key(),
+            streaming=streaming,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client()
         )
     
 def get_jira_toolkit():
+    return _shared('jira_toolkit', _create_jira_toolkit)
+
+def _create_jira_toolkit():
     cfg = get_jira_config()
     jira = JiraAPIWrapper(**cfg)
     return JiraToolkit.from_jira_api_wrapper(jira)
 
+def get_jira_client():
+    """The Jira client used by tools/jira_tools.py, created once per process.
+
+    Its requests session keeps up to JIRA_POOL_SIZE connections alive. The
+    server info is still fetched when it is created: the client picks its
+    Cloud or Server API calls from it (search on Cloud uses the enhanced
+    search endpoint), and being shared the client only fetches it once.
+    """
+    return _shared('jira_client', _create_jira_client)
+
+def _create_jira_client():
+    # Only the Jira tools need the jira package
+    from jira import JIRA
+    from requests.adapters import HTTPAdapter
+
+    cfg = get_jira_config()
+    pool_size = get_jira_tools_config()['pool_size']
+    jira = JIRA(server=cfg['jira_instance_url'], basic_auth=(cfg['jira_username'], cfg['jira_api_token']))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    jira._session.mount('https://', adapter)
+    jira._session.mount('http://', adapter)
+    return jira
+
 def get_github_toolkit():
+    return _shared('github_toolkit', _create_github_toolkit)
+
+def _create_github_toolkit():
     cfg = get_github_config()
     github = GitHubAPIWrapper(**cfg)
     return GitHubToolkit.from_github_api_wrapper(github)
\ No newline at end of file
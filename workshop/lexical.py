@@ -0,0 +1,184 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+LEXICAL_DIR = 'lexical'
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_PARTS = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def tokenize(text):
+    """Identifier-aware tokens: each identifier in full plus its camelCase and
+    snake_case parts, lower-cased, so "GetUserById" matches "user" and
+    "get_user_by_id" as well as itself."""
+    tokens = []
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        if len(lowered) > 1:
+            tokens.append(lowered)
+        parts = _PARTS.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if len(part) > 1)
+    return tokens
+
+
+def term_id(term):
+    """Stable 64 bit id for a term; the index stores ids rather than strings."""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def ids_digest(ids):
+    """Fingerprint of the docstore ids in position order."""
+    digest = hashlib.sha256()
+    for doc_id in ids:
+        digest.update(doc_id.encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+def _load_postings(path):
+    """Postings of an existing index as flat (term, doc, tf) arrays, plus doc lengths."""
+    path = Path(path, LEXICAL_DIR)
+    offsets = np.load(path / 'offsets.npy')
+    terms = np.repeat(np.load(path / 'terms.npy'), np.diff(offsets))
+    return terms, np.load(path / 'docs.npy'), np.load(path / 'tfs.npy'), np.load(path / 'doc_lens.npy')
+
+
+def build_lexical_index(db, path, previous_ids=None, batch_size=10000):
+    """Write a BM25 inverted index over every chunk of a FAISS store.
+
+    Documents are numbered by their index position, as in the vector index.
+    Postings are stored as flat numpy arrays (sorted term ids, offsets, doc
+    positions, term frequencies) so they can be memory-mapped at query time.
+
+    previous_ids are the store's ids in position order before this build
+    changed it. When they match the index already at path, its postings are
+    kept for the chunks still in the store, renumbered to their new
+    positions, and only chunks added since are read and tokenized.
+    """
+    ids = [db.index_to_docstore_id[position] for position in range(len(db.index_to_docstore_id))]
+    doc_lens = np.zeros(len(ids), dtype=np.int32)
+    parts = [(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16))]
+    new_positions = range(len(ids))
+
+    meta_path = Path(path, LEXICAL_DIR, 'meta.json')
+    if previous_ids is not None and meta_path.exists():
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('ids_digest') == ids_digest(previous_ids):
+            positions = {doc_id: position for position, doc_id in enumerate(ids)}
+            # Old position -> new position, or -1 for chunks deleted since
+            remap = np.array([positions.get(doc_id, -1) for doc_id in previous_ids], dtype=np.int64)
+            terms, docs, tfs, old_lens = _load_postings(path)
+            docs = remap[docs]
+            kept = docs >= 0
+            parts.append((terms[kept], docs[kept], tfs[kept]))
+            doc_lens[remap[remap >= 0]] = old_lens[remap >= 0]
+            reused = set(previous_ids)
+            new_positions = [position for position, doc_id in enumerate(ids) if doc_id not in reused]
+
+    # Chunks are tokenized in batches into flat arrays rather than per-term
+    # lists, so memory follows the number of postings
+    for start in range(0, len(new_positions), batch_size):
+        batch_terms, batch_docs, batch_tfs = [], [], []
+        for position in new_positions[start:start + batch_size]:
+            counts = Counter(term_id(token) for token in tokenize(db.docstore.search(ids[position]).page_content))
+            doc_lens[position] = sum(counts.values())
+            batch_terms.extend(counts.keys())
+            batch_docs.extend([position] * len(counts))
+            batch_tfs.extend(min(tf, 65535) for tf in counts.values())
+        parts.append((
+            np.array(batch_terms, dtype=np.uint64),
+            np.array(batch_docs, dtype=np.int64),
+            np.array(batch_tfs, dtype=np.uint16),
+        ))
+
+    # Postings are grouped by term, in document order within a term
+    all_terms, all_docs, all_tfs = (np.concatenate(arrays) for arrays in zip(*parts))
+    order = np.lexsort((all_docs, all_terms))
+    all_terms, all_docs, all_tfs = all_terms[order], all_docs[order].astype(np.int32), all_tfs[order]
+    terms, starts = np.unique(all_terms, return_index=True)
+    offsets = np.append(starts, len(all_terms)).astype(np.int64)
+
+    out = Path(path, LEXICAL_DIR)
+    tmp = Path(path, LEXICAL_DIR + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    np.save(tmp / 'terms.npy', terms)
+    np.save(tmp / 'offsets.npy', offsets)
+    np.save(tmp / 'docs.npy', all_docs)
+    np.save(tmp / 'tfs.npy', all_tfs)
+    np.save(tmp / 'doc_lens.npy', doc_lens)
+    with open(tmp / 'meta.json', 'w') as f:
+        json.dump({
+            'documents': int(len(doc_lens)),
+            'avgdl': float(doc_lens.mean()) if len(doc_lens) else 0.0,
+            'ids_digest': ids_digest(ids),
+        }, f)
+
+    # Swap directories with renames, so the path is only missing between them;
+    # files still mapped by a running query service are unlinked, not truncated
+    old = Path(path, LEXICAL_DIR + '.old')
+    shutil.rmtree(old, ignore_errors=True)
+    if out.exists():
+        os.replace(out, old)
+    os.replace(tmp, out)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class LexicalIndex():
+    """Memory-mapped BM25 index written by build_lexical_index."""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        path = Path(path, LEXICAL_DIR)
+        self.terms = np.load(path / 'terms.npy', mmap_mode='r')
+        self.offsets = np.load(path / 'offsets.npy', mmap_mode='r')
+        self.docs = np.load(path / 'docs.npy', mmap_mode='r')
+        self.tfs = np.load(path / 'tfs.npy', mmap_mode='r')
+        self.doc_lens = np.load(path / 'doc_lens.npy', mmap_mode='r')
+        with open(path / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        self.count = meta['documents']
+        self.avgdl = meta['avgdl'] or 1.0
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def load(cls, path):
+        if not Path(path, LEXICAL_DIR, 'meta.json').exists():
+            return None
+        return cls(path)
+
+    def search(self, query, k=20):
+        """Top k (position, score) pairs for a query by BM25."""
+        ids = np.array(sorted({term_id(token) for token in tokenize(query)}), dtype=np.uint64)
+        if len(ids) == 0 or len(self.terms) == 0:
+            return []
+
+        found = np.searchsorted(self.terms, ids)
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term, i in zip(ids, found):
+            if i >= len(self.terms) or self.terms[i] != term:
+                continue
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            docs = np.asarray(self.docs[start:end])
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = math.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lens[docs]) / self.avgdl)
+            # A term has one posting per document, so positions are unique
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(scores[matched])[::-1]]
+        return [(int(position), float(scores[position])) for position in matched]
@@ -1,7 +1,50 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
+import chardet
+
 from langchain_community.document_loaders.blob_loaders.schema import Blob, BlobLoader
-from langchain_community.document_loaders.helpers import detect_file_encodings
+
+from .walker import DirectoryWalker, DEFAULT_PRUNED_DIRS
+
+
+def detect_encodings(data):
+    """Candidate encodings for raw bytes, most likely first."""
+    return [e['encoding'] for e in chardet.detect_all(data) if e['encoding'] is not None]
+
+
+def load_text_blob(file_path, encoding='utf-8', autodetect_encoding=True):
+    """Read a file once as bytes and decode it from the buffer.
+
+    Encoding detection only runs on the in-memory bytes when the configured
+    encoding fails, rather than re-opening the file for every candidate.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except Exception as e:
+        raise RuntimeError(f"Error loading {file_path}") from e
+
+    text = ""
+    enc = encoding
+    try:
+        text = data.decode(encoding or 'utf-8')
+    except UnicodeDecodeError as e:
+        if not autodetect_encoding:
+            raise RuntimeError(f"Error loading {file_path}") from e
+        for candidate in detect_encodings(data):
+            try:
+                text = data.decode(candidate)
+                enc = candidate
+                break
+            except (UnicodeDecodeError, LookupError):
+                continue
+
+    # Match the universal newline handling of reading in text mode
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return Blob.from_data(text, encoding=enc, path=file_path)
+
 
 class FileSystemModel():
     def __init__(
@@ -10,7 +53,10 @@ class FileSystemModel():
         includes=['**/*'],
         suffixes=[],
         excludes=[],
-        excludes_matching=[]
+        excludes_matching=[],
+        prune=DEFAULT_PRUNED_DIRS,
+        use_gitignore=True,
+        shard=None
     ):
         if isinstance(path, Path):
             _path = path
@@ -24,68 +70,82 @@ class FileSystemModel():
         self.suffixes = suffixes
         self.excludes = excludes
         self.excludes_matching = excludes_matching
+        self.prune = prune
+        self.use_gitignore = use_gitignore
+        self.shard = shard
 
     def yield_paths(self):
-        excluded_paths = self._yield_exclude_globs()
-
-        for include_glob in self.includes:
-            for path in self.path.glob(include_glob):
-                if self.excludes:
-                    if path in excluded_paths:
-                        continue
-                if self.excludes_matching:
-                    if any(pattern in str(path) for pattern in self.excludes_matching):
-                        continue
-                if path.is_file():
-                    if self.suffixes and path.suffix not in self.suffixes:
-                        continue
-                    yield path
-
-    def _yield_exclude_globs(self):
-        for exclude_glob in self.excludes:
-            for path in self.path.glob(exclude_glob):
-                if path.is_file():
-                    yield path
+        walker = DirectoryWalker(
+            self.path,
+            includes=self.includes,
+            suffixes=self.suffixes,
+            excludes=self.excludes,
+            excludes_matching=self.excludes_matching,
+            prune=self.prune,
+            use_gitignore=self.use_gitignore
+        )
+        return walker.walk()
 
 class TextBlobListLoader(BlobLoader):
     def __init__(
         self,
         paths,
         encoding = 'utf-8',
-        autodetect_encoding = True
+        autodetect_encoding = True,
+        max_workers = 1,
+        max_in_flight = None,
+        preserve_order = True
     ):
+        """Load text blobs for a list of paths.
+
+        With max_workers > 1 files are read on a thread pool. At most
+        max_in_flight reads (default 4 per worker) are queued ahead of the
+        consumer, and preserve_order=False yields blobs as soon as they are
+        read instead of in path order.
+        """
         self.paths = paths
         self.encoding = encoding
         self.autodetect_encoding = autodetect_encoding
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers * 4
+        self.preserve_order = preserve_order
 
     def yield_blobs(self):
-        for path in self.paths:
-            yield self.yield_blob(path)
+        if self.max_workers <= 1:
+            for path in self.paths:
+                yield self.yield_blob(path)
+        elif self.preserve_order:
+            yield from self._yield_blobs_ordered()
+        else:
+            yield from self._yield_blobs_unordered()
+
+    def _yield_blobs_ordered(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for path in self.paths:
+                if len(pending) >= self.max_in_flight:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(self.yield_blob, path))
+            while pending:
+                yield pending.popleft().result()
+
+    def _yield_blobs_unordered(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for path in self.paths:
+                if len(pending) >= self.max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(executor.submit(self.yield_blob, path))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
 
     def yield_blob(self, file_path):
         """Load from file path."""
-        text = ""
-        enc = self.encoding
-        try:
-            with open(file_path, encoding=self.encoding) as f:
-                text = f.read()
-        except UnicodeDecodeError as e:
-            if self.autodetect_encoding:
-                detected_encodings = detect_file_encodings(file_path)
-                for encoding in detected_encodings:
-                    try:
-                        with open(file_path, encoding=encoding.encoding) as f:
-                            text = f.read()
-                            enc = encoding.encoding
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            else:
-                raise RuntimeError(f"Error loading {file_path}") from e
-        except Exception as e:
-            raise RuntimeError(f"Error loading {file_path}") from e
-
-        return Blob.from_data(text, encoding=enc, path=file_path)
+        return load_text_blob(file_path, self.encoding, self.autodetect_encoding)
 
 class TextBlobLoader(BlobLoader):
     def __init__(
@@ -125,25 +185,4 @@ class TextBlobLoader(BlobLoader):
 
     def yield_blob(self, file_path):
         """Load from file path."""
-        text = ""
-        enc = self.encoding
-        try:
-            with open(file_path, encoding=self.encoding) as f:
-                text = f.read()
-        except UnicodeDecodeError as e:
-            if self.autodetect_encoding:
-                detected_encodings = detect_file_encodings(file_path)
-                for encoding in detected_encodings:
-                    try:
-                        with open(file_path, encoding=encoding.encoding) as f:
-                            text = f.read()
-                            enc = encoding.encoding
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            else:
-                raise RuntimeError(f"Error loading {file_path}") from e
-        except Exception as e:
-            raise RuntimeError(f"Error loading {file_path}") from e
-
-        return Blob.from_data(text, encoding=enc, path=file_path)
\ No newline at end of file
+        return load_text_blob(file_path, self.encoding, self.autodetect_encoding)
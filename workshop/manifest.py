@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+
+from pathlib import Path
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestChanges():
+    """Result of comparing a set of paths against a BuildManifest."""
+
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.unchanged = []
+        self.stale = []
+        self.stats = {}
+        self.hashes = {}
+
+    @property
+    def to_load(self):
+        return self.added + self.changed
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+class BuildManifest():
+    """Per-file record of what is currently embedded in the vector database.
+
+    Each entry holds the size, mtime, content hash and the ids of the chunks
+    created from that file, so a rebuild only has to embed added or changed
+    files and can delete the vectors of removed ones. The splitter and dedup
+    settings the chunks were made with are kept alongside, as they apply to
+    every entry.
+
+    The manifest is only valid for the index written with it: index_version
+    is the version stamped on the database by the same build, and the file is
+    removed before a build starts replacing the index files.
+    """
+
+    def __init__(self, path, entries=None, settings=None, index_version=None):
+        self.path = Path(path)
+        self.entries = entries or {}
+        self.settings = settings
+        self.index_version = index_version
+
+    @classmethod
+    def load(cls, db_path):
+        path = Path(db_path, MANIFEST_FILE)
+        if not path.exists():
+            return cls(path)
+
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+
+        return cls(path, data.get('files', {}), data.get('settings'), data.get('index_version'))
+
+    def save(self):
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'index_version': self.index_version,
+                'settings': self.settings,
+                'files': self.entries,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def invalidate(self):
+        """Remove the saved manifest, so a build that fails while replacing
+        the index is followed by a full rebuild."""
+        self.path.unlink(missing_ok=True)
+
+    def diff(self, paths):
+        """Classify paths as added, changed or unchanged and find removed files.
+
+        The size and mtime are compared first; the content is only hashed when
+        they differ, so touching a file without editing it does not trigger a
+        re-embed.
+        """
+        changes = ManifestChanges()
+        seen = set()
+
+        for path in paths:
+            key = str(path)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            st = os.stat(path)
+            changes.stats[key] = st
+            entry = self.entries.get(key)
+
+            if entry is None:
+                changes.added.append(path)
+                continue
+
+            if entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+                changes.unchanged.append(path)
+                continue
+
+            content_hash = hash_file(path)
+            changes.hashes[key] = content_hash
+            if content_hash == entry['hash']:
+                entry['mtime'] = st.st_mtime_ns
+                changes.unchanged.append(path)
+            else:
+                changes.changed.append(path)
+                changes.stale.extend(entry['ids'])
+
+        for key, entry in self.entries.items():
+            if key not in seen:
+                changes.removed.append(key)
+                changes.stale.extend(entry['ids'])
+
+        # Files holding an exact copy of a chunk share its id, so a vector is
+        # only stale once no unchanged file refers to it
+        live = {chunk_id for path in changes.unchanged for chunk_id in self.entries[str(path)]['ids']}
+        changes.stale = [chunk_id for chunk_id in dict.fromkeys(changes.stale) if chunk_id not in live]
+
+        return changes
+
+    def apply(self, changes, ids_by_path):
+        """Record the result of a build in the manifest."""
+        for key in changes.removed:
+            self.entries.pop(key, None)
+
+        for path in changes.to_load:
+            key = str(path)
+            st = changes.stats.get(key) or os.stat(path)
+            content_hash = changes.hashes.get(key) or hash_file(path)
+            self.entries[key] = {
+                'size': st.st_size,
+                'mtime': st.st_mtime_ns,
+                'hash': content_hash,
+                'ids': list(dict.fromkeys(ids_by_path.get(key, []))),
+            }
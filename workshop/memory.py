@@ -0,0 +1,143 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.memory import ConversationSummaryMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.messages import SystemMessage, get_buffer_string
+
+from .config import get_memory_config
+from .tokens import count_tokens
+
+MEMORY_MODES = ['summary', 'window', 'lazy_summary']
+
+# Summaries are written one at a time, off the question's critical path
+_summarizer = ThreadPoolExecutor(max_workers=1)
+_summary_lock = threading.Lock()
+
+
+def get_chat_history(chat_history):
+    """Chat history as text for question condensing, ignoring empty messages.
+
+    ConversationSummaryMemory starts with an empty summary message, which
+    would otherwise make the chain condense the very first question.
+    """
+    if isinstance(chat_history, str):
+        return chat_history
+    return _get_chat_history([message for message in chat_history if message.content])
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """Sliding window of recent messages within max_token_limit tokens.
+
+    Messages that fall out of the window are dropped, or with summarize set
+    folded into a running summary by a background thread. Until that summary
+    is ready the messages stay in the window, so no turn blocks on it and no
+    context is lost; the summary is sent ahead of the window as a system
+    message.
+    """
+
+    llm: Any = None
+    max_token_limit: int = 2000
+    summarize: bool = True
+    summary: str = ''
+    memory_key: str = 'chat_history'
+    human_prefix: str = 'Human'
+    ai_prefix: str = 'AI'
+    pending: Any = None
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with _summary_lock:
+            messages = list(self.chat_memory.messages)
+            if self.summary:
+                messages.insert(0, SystemMessage(content=self.summary))
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self.prune()
+
+    def clear(self) -> None:
+        super().clear()
+        with _summary_lock:
+            self.summary = ''
+
+    def _overflow(self):
+        """The oldest messages that must go to bring the window within budget."""
+        messages = self.chat_memory.messages
+        tokens = [count_tokens(get_buffer_string([message])) for message in messages]
+        total = sum(tokens)
+        overflow = 0
+        # The latest exchange is always kept
+        while total > self.max_token_limit and overflow < len(messages) - 2:
+            total -= tokens[overflow]
+            overflow += 1
+        return list(messages[:overflow])
+
+    def prune(self):
+        if self.pending is not None and not self.pending.done():
+            return
+
+        overflow = self._overflow()
+        if not overflow:
+            return
+        if not self.summarize or self.llm is None:
+            self._drop(overflow)
+            return
+        self.pending = _summarizer.submit(self._summarize, overflow, self.summary)
+
+    def _drop(self, overflow, summary=None):
+        with _summary_lock:
+            messages = self.chat_memory.messages
+            # Only drop the messages summarised if they are still the oldest
+            if all(a is b for a, b in zip(messages, overflow)):
+                del messages[:len(overflow)]
+                if summary is not None:
+                    self.summary = summary
+
+    def _summarize(self, overflow, summary):
+        try:
+            prompt = SUMMARY_PROMPT.format(
+                summary=summary,
+                new_lines=get_buffer_string(overflow, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+            )
+            result = self.llm.invoke(prompt)
+            self._drop(overflow, getattr(result, 'content', result))
+        except Exception:
+            # Fall back to a plain window rather than growing without bound
+            self._drop(overflow)
+
+
+def get_memory(llm):
+    """Conversation memory for get_qa, chosen by MEMORY_MODE. The output key
+    is set as the chain also returns the generated question."""
+    config = get_memory_config()
+    mode = config['mode']
+    if mode == 'summary':
+        return ConversationSummaryMemory(
+            llm=llm,
+            memory_key="chat_history",
+            input_key="question",
+            output_key="answer",
+            return_messages=True
+        )
+    if mode in ('window', 'lazy_summary'):
+        return TokenBudgetMemory(
+            llm=llm,
+            max_token_limit=config['max_tokens'],
+            summarize=mode == 'lazy_summary',
+            memory_key="chat_history",
+            input_key="question",
+            output_key="answer",
+            return_messages=True
+        )
+    raise ValueError(f"Unknown memory mode {mode}, expected one of {MEMORY_MODES}")
@@ -1,28 +1,129 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from pathlib import Path
+
 from phply.phpparse import make_parser
 from phply.phplex import lexer
 from phply import phpast as ast
 
 from langchain_community.document_loaders.parsers.language.code_segmenter import CodeSegmenter
 
+# Bump when the span extraction changes so cached spans are recomputed
+SPAN_CACHE_VERSION = 1
+
+_parsers = threading.local()
+
+
+def get_parser():
+    """A ply parser built once per thread and reused for every file."""
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = make_parser()
+        _parsers.parser = parser
+    return parser
+
+
+def parse(code):
+    parser = get_parser()
+    try:
+        return parser.parse(code, lexer.clone())
+    finally:
+        parser.restart()
+
+
+class SpanCache():
+    """On-disk cache of PHP function/class line spans keyed by source hash.
+
+    Connections are opened lazily per process, so a cache created before the
+    build's worker processes fork is safe to use in them.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS spans (key TEXT PRIMARY KEY, spans TEXT)')
+            self._pid = os.getpid()
+        return self._conn
+
+    def __getstate__(self):
+        return {'path': self.path, '_conn': None, '_pid': None}
+
+    def get(self, key):
+        row = self._connection().execute('SELECT spans FROM spans WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, key, spans):
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO spans (key, spans) VALUES (?, ?)', (key, spans))
+        conn.commit()
+
 
 class PHPSegmenter(CodeSegmenter):
-    """Code segmenter for `Python`."""
+    """Code segmenter for `PHP`.
 
-    def __init__(self, code: str):
+    The source is parsed at most once and only the line spans of top level
+    functions and classes are kept; is_valid, extract_functions_classes and
+    simplify_code all work from those spans. With a SpanCache the spans of
+    previously seen sources are read from disk instead of parsed.
+    """
+
+    def __init__(self, code: str, span_cache=None):
         super().__init__(code)
         self.source_lines = self.code.splitlines()
+        self.span_cache = span_cache
+        self._spans = None
+        self._parsed = False
 
+    def _cache_key(self):
+        digest = hashlib.sha256(self.code.encode('utf-8', errors='surrogatepass')).hexdigest()
+        return f'{SPAN_CACHE_VERSION}:{digest}'
 
-    def is_valid(self):
+    def _parse_spans(self):
         try:
-            parser = make_parser()
-            result = parser.parse(self.code, lexer.clone())
-            parser.restart()
-            return True
-        except AssertionError:
-            return False
-        except SyntaxError:
-            return False
+            result = parse(self.code)
+        except (AssertionError, SyntaxError):
+            return None
+
+        return [
+            self._get_line_indexes(node)
+            for node in result
+            if isinstance(node, (ast.Class, ast.Function))
+        ]
+
+    def _get_spans(self):
+        """Spans of top level functions and classes, or None if the code does not parse."""
+        if self._parsed:
+            return self._spans
+
+        key = None
+        cached = None
+        if self.span_cache is not None:
+            key = self._cache_key()
+            cached = self.span_cache.get(key)
+
+        if cached is not None:
+            self._spans = json.loads(cached)
+        else:
+            self._spans = self._parse_spans()
+            if key is not None:
+                self.span_cache.put(key, json.dumps(self._spans))
+
+        self._parsed = True
+        return self._spans
+
+    def is_valid(self):
+        return self._get_spans() is not None
 
     def _get_line_indexes(self, node):
         start = node.lineno - 1
@@ -37,37 +138,20 @@ class PHPSegmenter(CodeSegmenter):
         else:
             end = node.lineno - 1
         return [start,end]
-    
-    def _extract_code(self, node):
-        [start, end] = self._get_line_indexes(node)
-        return "\n".join(self.source_lines[start:end])
 
     def extract_functions_classes(self):
-        functions_classes = []
-        parser = make_parser()
-        result = parser.parse(self.code, lexer.clone())
-        parser.restart()
-
-        for node in result:
-            if isinstance(node, (ast.Class, ast.Function)):
-                code = self._extract_code(node)
-                functions_classes.append(code)
-
-        return functions_classes
+        return [
+            "\n".join(self.source_lines[start:end])
+            for [start, end] in self._get_spans() or []
+        ]
 
     def simplify_code(self):
         all_lines = self.source_lines[:]
-        parser = make_parser()
-        result = parser.parse(self.code, lexer.clone())
-        parser.restart()
-
-        for node in result:
-            if isinstance(node, (ast.Class, ast.Function)):
-                [start, end] = self._get_line_indexes(node)
 
-                all_lines[start] = f'// Simplified Code for {all_lines[start]}'
+        for [start, end] in self._get_spans() or []:
+            all_lines[start] = f'// Simplified Code for {all_lines[start]}'
 
-                for i in range(start + 1, end):
-                    all_lines[i] = None
+            for i in range(start + 1, end):
+                all_lines[i] = None
 
         return "\n".join(line for line in all_lines if line is not None)
@@ -0,0 +1,82 @@
+import uuid
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_community.document_loaders.generic import GenericLoader
+from langchain_community.document_loaders.parsers.txt import TextParser
+from langchain_community.vectorstores import FAISS
+
+from .loaders import TextBlobListLoader
+
+
+def batched(iterable, size):
+    """Group an iterable into lists of at most size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_documents(paths, max_workers=1):
+    """Lazily load one document per path."""
+    blob_loader = TextBlobListLoader(paths=paths, max_workers=max_workers)
+    return GenericLoader(blob_loader, TextParser()).lazy_load()
+
+
+def _split_document(splitter, document):
+    return splitter.split_documents([document])
+
+
+def split_documents(documents, splitter, max_workers=1, max_in_flight=None):
+    """Lazily split documents, one document at a time.
+
+    With max_workers > 1 splitting runs in a process pool, keeping at most
+    max_in_flight documents (default 4 per worker) queued and yielding chunks
+    in document order.
+    """
+    if max_workers <= 1:
+        for document in documents:
+            yield from splitter.split_documents([document])
+        return
+
+    max_in_flight = max_in_flight or max_workers * 4
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for document in documents:
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_split_document, splitter, document))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def assign_chunk_ids(texts, ids_by_path):
+    """Give each chunk a unique id, recording the ids created per source file."""
+    for text in texts:
+        chunk_id = str(uuid.uuid4())
+        text.metadata['chunk_id'] = chunk_id
+        ids_by_path.setdefault(text.metadata['source'], []).append(chunk_id)
+        yield text
+
+
+def index_documents(texts, embeddings, db=None, batch_size=256, on_batch=None):
+    """Embed chunks and add them to a FAISS store in bounded batches.
+
+    Every stage upstream is a generator, so only one batch of chunks (plus the
+    loader's read-ahead) is held in memory at a time; the consumer pulling the
+    next batch is what drives loading and splitting.
+    """
+    for batch in batched(texts, batch_size):
+        ids = [text.metadata['chunk_id'] for text in batch]
+        if db is None:
+            db = FAISS.from_documents(batch, embeddings, ids=ids)
+        else:
+            db.add_documents(batch, ids=ids)
+        if on_batch is not None:
+            on_batch(batch)
+    return db
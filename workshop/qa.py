@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import AsyncCallbackHandler
+
+
+class _TokenQueue(AsyncCallbackHandler):
+    """Puts the answer LLM's tokens on a queue for astream."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.queue.put_nowait(token)
+
+
+class ConversationalQA():
+    """A ConversationalRetrievalChain with an optional SemanticAnswerCache and
+    an asyncio API.
+
+    Follow-up questions are condensed into a standalone question first, as the
+    chain does, and with a cache that question is looked up. Otherwise the
+    chain's own retriever and combine_docs_chain answer it, so the question is
+    condensed only once; either way the turn is saved to the chain's memory.
+
+    ainvoke and astream run every step on the event loop (retrieval offloads
+    its searches to threads). Saving the turn to memory and the cache runs in
+    the background and is only awaited by the session's next question, so it
+    overlaps with the answer being returned.
+    """
+
+    def __init__(self, chain, cache=None, embeddings=None):
+        self.chain = chain
+        self.cache = cache
+        self.embeddings = embeddings
+        self._saving = None
+
+    @property
+    def memory(self):
+        return self.chain.memory
+
+    def _chat_history(self):
+        chain = self.chain
+        chat_history = chain.memory.load_memory_variables({})[chain.memory.memory_key]
+        return chat_history, (chain.get_chat_history or _get_chat_history)(chat_history)
+
+    def _combine_inputs(self, documents, question, standalone, chat_history_str):
+        return {
+            'input_documents': documents,
+            'question': standalone if self.chain.rephrase_question else question,
+            'chat_history': chat_history_str,
+        }
+
+    def _result(self, question, chat_history, answer, standalone, documents, cached):
+        return {
+            'question': question,
+            'chat_history': chat_history,
+            self.chain.output_key: answer,
+            'generated_question': standalone,
+            'source_documents': documents,
+            'cached': cached is not None,
+        }
+
+    def invoke(self, question):
+        if self.cache is None:
+            return self.chain.invoke(question)
+
+        chain = self.chain
+        chat_history, chat_history_str = self._chat_history()
+
+        standalone = question
+        if chat_history_str:
+            standalone = chain.question_generator.invoke(
+                {'question': question, 'chat_history': chat_history_str}
+            )[chain.question_generator.output_key]
+
+        vector = self.embeddings.embed_query(standalone)
+        cached = self.cache.lookup(vector)
+        if cached is not None:
+            answer = cached['answer']
+            documents = cached['source_documents']
+        else:
+            documents = chain._reduce_tokens_below_limit(chain.retriever.invoke(standalone))
+            answer = chain.combine_docs_chain.invoke(
+                self._combine_inputs(documents, question, standalone, chat_history_str)
+            )[chain.combine_docs_chain.output_key]
+            self.cache.put(standalone, vector, answer, documents)
+
+        chain.memory.save_context({'question': question}, {chain.output_key: answer})
+        return self._result(question, chat_history, answer, standalone, documents, cached)
+
+    def _save(self, question, answer, standalone=None, vector=None, documents=None):
+        self.chain.memory.save_context({'question': question}, {self.chain.output_key: answer})
+        if vector is not None:
+            self.cache.put(standalone, vector, answer, documents)
+
+    async def wait_saved(self):
+        """Wait for the previous turn to be saved to memory."""
+        if self._saving is not None:
+            await self._saving
+            self._saving = None
+
+    async def ainvoke(self, question, callbacks=None):
+        """Answer a question; callbacks are passed to the answer generation only."""
+        await self.wait_saved()
+
+        chain = self.chain
+        chat_history, chat_history_str = self._chat_history()
+
+        standalone = question
+        if chat_history_str:
+            standalone = (await chain.question_generator.ainvoke(
+                {'question': question, 'chat_history': chat_history_str}
+            ))[chain.question_generator.output_key]
+
+        cached = None
+        vector = None
+        if self.cache is not None:
+            vector = await self.embeddings.aembed_query(standalone)
+            cached = await asyncio.to_thread(self.cache.lookup, vector)
+
+        if cached is not None:
+            answer = cached['answer']
+            documents = cached['source_documents']
+            vector = None
+        else:
+            documents = chain._reduce_tokens_below_limit(await chain.retriever.ainvoke(standalone))
+            answer = (await chain.combine_docs_chain.ainvoke(
+                self._combine_inputs(documents, question, standalone, chat_history_str),
+                config={'callbacks': callbacks},
+            ))[chain.combine_docs_chain.output_key]
+
+        self._saving = asyncio.create_task(asyncio.to_thread(self._save, question, answer, standalone, vector, documents))
+        return self._result(question, chat_history, answer, standalone, documents, cached)
+
+    async def astream(self, question):
+        """Yield {'type': 'token', 'text': ...} as the answer is generated,
+        then {'type': 'answer', ...} with the result and its timings."""
+        started = time.perf_counter()
+        first_token = None
+        tokens = _TokenQueue()
+
+        task = asyncio.create_task(self.ainvoke(question, callbacks=[tokens]))
+        task.add_done_callback(lambda _: tokens.queue.put_nowait(None))
+        while True:
+            token = await tokens.queue.get()
+            if token is None:
+                break
+            if first_token is None:
+                first_token = time.perf_counter()
+            yield {'type': 'token', 'text': token}
+
+        result = task.result()
+        yield {
+            'type': 'answer',
+            **result,
+            'time_to_first_token': None if first_token is None else first_token - started,
+            'seconds': time.perf_counter() - started,
+        }
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from .config import get_query_cache_config
+from .stores import read_index_version
+
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_question(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation, so
+    trivially different phrasings of a question share cache entries."""
+    return _SPACE.sub(' ', text).strip().rstrip('?.! ').lower()
+
+
+class QueryCache():
+    """Two level LRU cache of query results for one database version.
+
+    Recent entries are held in memory; all entries are kept in SQLite so they
+    survive between sessions. Keys include the index version written by
+    build.py, so a rebuilt database never serves stale results and its old
+    entries age out of the LRU. Each entry records how long it took to
+    compute, so hits can be reported as time saved.
+    """
+
+    def __init__(self, path, version, max_entries=20000, memory_entries=256):
+        self.version = version
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.stats = {}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS queries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, cost REAL NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS queries_last_used ON queries (last_used)')
+        self._conn.commit()
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f'{self.version}\0{kind}\0{normalize_question(text)}'.encode('utf-8')).hexdigest()
+
+    def _stats(self, kind):
+        # Retrieval kinds carry their search settings after a colon
+        return self.stats.setdefault(kind.split(':', 1)[0], {'hits': 0, 'misses': 0, 'saved': 0.0})
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, kind, text):
+        """The cached value, or None; hits are counted with the time they saved."""
+        key = self._key(kind, text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute('SELECT value, cost FROM queries WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+                    self._conn.execute('UPDATE queries SET last_used = ? WHERE key = ?', (int(time.time()), key))
+                    self._conn.commit()
+
+            stats = self._stats(kind)
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            stats['hits'] += 1
+            stats['saved'] += entry[1]
+            return entry[0]
+
+    def put(self, kind, text, value, cost):
+        key = self._key(kind, text)
+        with self._lock:
+            self._remember(key, (value, cost))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO queries (key, value, cost, last_used) VALUES (?, ?, ?, ?)',
+                (key, value, cost, int(time.time()))
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        [count] = self._conn.execute('SELECT COUNT(*) FROM queries').fetchone()
+        if count <= self.max_entries:
+            return
+        # Evict down to 90% so eviction does not run on every insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            'DELETE FROM queries WHERE key IN '
+            '(SELECT key FROM queries ORDER BY last_used LIMIT ?)', (excess,)
+        )
+        self._conn.commit()
+
+    def summary(self):
+        """One line of hit rates and saved time per kind, for the console log."""
+        parts = []
+        for kind, stats in self.stats.items():
+            total = stats['hits'] + stats['misses']
+            parts.append(f"{kind} {stats['hits']}/{total} hits, saved {stats['saved']:.2f}s")
+        return '; '.join(parts)
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """Serves query embeddings from a QueryCache; documents pass through."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text):
+        cached = self.cache.get('embedding', text)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32).tolist()
+
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        self.cache.put('embedding', text, np.asarray(vector, dtype=np.float32).tobytes(), time.perf_counter() - start)
+        return vector
+
+    async def aembed_query(self, text):
+        # SQLite reads and commits would block every session on the loop
+        cached = await asyncio.to_thread(self.cache.get, 'embedding', text)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32).tolist()
+
+        start = time.perf_counter()
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self.cache.put, 'embedding', text, np.asarray(vector, dtype=np.float32).tobytes(), time.perf_counter() - start)
+        return vector
+
+
+class QueryCachedRetriever(BaseRetriever):
+    """Serves a retriever's documents from a QueryCache.
+
+    The cache kind includes the retriever's search settings, so retrievers
+    with different settings over the same database do not share results.
+    """
+
+    retriever: Any
+    cache: Any
+    kind: str = 'retrieval'
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        cached = self.cache.get(self.kind, query)
+        if cached is not None:
+            return [Document(page_content=content, metadata=metadata) for content, metadata in json.loads(cached)]
+
+        start = time.perf_counter()
+        documents = self.retriever.invoke(query, config={'callbacks': run_manager.get_child()})
+        value = json.dumps([(doc.page_content, doc.metadata) for doc in documents], default=str)
+        self.cache.put(self.kind, query, value, time.perf_counter() - start)
+        return documents
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        cached = await asyncio.to_thread(self.cache.get, self.kind, query)
+        if cached is not None:
+            return [Document(page_content=content, metadata=metadata) for content, metadata in json.loads(cached)]
+
+        start = time.perf_counter()
+        documents = await self.retriever.ainvoke(query, config={'callbacks': run_manager.get_child()})
+        value = json.dumps([(doc.page_content, doc.metadata) for doc in documents], default=str)
+        await asyncio.to_thread(self.cache.put, self.kind, query, value, time.perf_counter() - start)
+        return documents
+
+
+def open_query_cache(db_path):
+    """A QueryCache for the database at db_path, or None when disabled."""
+    config = get_query_cache_config()
+    if not config['enabled']:
+        return None
+    return QueryCache(
+        config['path'],
+        read_index_version(db_path),
+        max_entries=config['max_entries'],
+        memory_entries=config['memory_entries'],
+    )
+
+
+def cached_retriever(retriever, cache, search_type, search_kwargs):
+    """Wrap a retriever in a QueryCachedRetriever keyed by its search settings."""
+    if cache is None:
+        return retriever
+    settings = json.dumps({'search_type': search_type, **search_kwargs}, sort_keys=True)
+    return QueryCachedRetriever(retriever=retriever, cache=cache, kind=f'retrieval:{type(retriever).__name__}:{settings}')
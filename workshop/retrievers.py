@@ -0,0 +1,109 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .config import get_hybrid_config
+from .shards import ShardedFAISS
+
+# Lexical search runs here while the query is embedded on the calling thread
+_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def has_lexical_index(store):
+    if isinstance(store, ShardedFAISS):
+        return any(has_lexical_index(shard) for shard in store.shards.values())
+    return getattr(store, 'lexical_index', None) is not None
+
+
+def lexical_search(store, query, k=20):
+    """Top k (document, BM25 score) pairs from a store's lexical index."""
+    if isinstance(store, ShardedFAISS):
+        futures = [store.executor.submit(lexical_search, shard, query, k) for shard in store.shards.values()]
+        results = [item for future in futures for item in future.result()]
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    lexical_index = getattr(store, 'lexical_index', None)
+    if lexical_index is None:
+        return []
+    return [
+        (store.docstore.search(store.index_to_docstore_id[position]), score)
+        for position, score in lexical_index.search(query, k)
+    ]
+
+
+def _document_key(doc):
+    return doc.metadata.get('chunk_id') or (doc.metadata.get('source'), doc.page_content)
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Merge ranked document lists by summing 1 / (rrf_k + rank) per document."""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing vector search with BM25 search over identifiers.
+
+    Embedding the query and the lexical search run concurrently; the two
+    rankings are merged with reciprocal rank fusion, so exact matches on
+    class, procedure and config names surface even when their embeddings
+    are not among the nearest.
+    """
+
+    store: Any
+    search_type: str = 'similarity'
+    search_kwargs: Dict[str, Any] = {}
+    lexical_k: int = 50
+    rrf_k: int = 60
+
+    def _search_by_vector(self, embedding):
+        if self.search_type == 'mmr':
+            results = self.store.max_marginal_relevance_search_with_score_by_vector(embedding, **self.search_kwargs)
+        else:
+            results = self.store.similarity_search_with_score_by_vector(embedding, **self.search_kwargs)
+        return [doc for doc, _ in results]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = _executor.submit(lexical_search, self.store, query, self.lexical_k)
+        vector = self._search_by_vector(self.store.embeddings.embed_query(query))
+        lexical = [doc for doc, _ in lexical.result()]
+        return reciprocal_rank_fusion([vector, lexical], self.search_kwargs.get('k', 4), self.rrf_k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        # The lexical search overlaps with embedding the query; both searches
+        # run on threads so the event loop is never blocked by faiss or SQLite
+        lexical = asyncio.create_task(asyncio.to_thread(lexical_search, self.store, query, self.lexical_k))
+        embedding = await self.store.embeddings.aembed_query(query)
+        vector = await asyncio.to_thread(self._search_by_vector, embedding)
+        lexical = [doc for doc, _ in await lexical]
+        return reciprocal_rank_fusion([vector, lexical], self.search_kwargs.get('k', 4), self.rrf_k)
+
+
+def get_retriever(db, search_type='similarity', search_kwargs=None):
+    """A hybrid retriever when the database has a lexical index and
+    HYBRID_SEARCH is on, otherwise the store's own retriever."""
+    search_kwargs = search_kwargs or {}
+    config = get_hybrid_config()
+    if not config['enabled'] or not has_lexical_index(db):
+        return db.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+    return HybridRetriever(
+        store=db,
+        search_type=search_type,
+        search_kwargs=search_kwargs,
+        lexical_k=config['lexical_k'],
+        rrf_k=config['rrf_k'],
+    )
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+from .answer_cache import open_answer_cache
+from .config import get_db_path, get_service_config
+from .integration import get_embeddings, get_qa
+from .query_cache import open_query_cache, cached_retriever, QueryCachedEmbeddings
+from .retrievers import get_retriever
+from .stores import load_database, read_index_version
+
+SEARCH_TYPE = "mmr"
+SEARCH_KWARGS = {"k": 20, "fetch_k": 30}
+
+
+class QueryEngine():
+    """One loaded database with its embeddings, caches and retriever, shared
+    by every session."""
+
+    def __init__(self, db_path):
+        self.version = read_index_version(db_path)
+        self.query_cache = open_query_cache(db_path)
+        self.embeddings = get_embeddings()
+        if self.query_cache is not None:
+            self.embeddings = QueryCachedEmbeddings(self.embeddings, self.query_cache)
+        self.db = load_database(self.embeddings, db_path)
+        self.retriever = cached_retriever(get_retriever(self.db, SEARCH_TYPE, SEARCH_KWARGS), self.query_cache, SEARCH_TYPE, SEARCH_KWARGS)
+        self.answer_cache = open_answer_cache(db_path)
+
+
+class Session():
+    """A conversation: its memory, and a chain over the engine it was built on.
+
+    Questions within a session are answered one at a time, on the event loop
+    through the chain's asyncio API. When the engine is swapped the chain is
+    rebuilt on the new one, keeping the memory.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.engine = None
+        self.qa = None
+        self.memory = None
+        self.lock = asyncio.Lock()
+        self.last_used = time.time()
+
+    def chain(self, engine):
+        if self.engine is not engine:
+            [self.qa, self.memory] = get_qa(
+                retriever=engine.retriever,
+                answer_cache=engine.answer_cache,
+                embeddings=engine.embeddings,
+                memory=self.memory,
+                streaming=True,
+            )
+            self.engine = engine
+        return self.qa
+
+    async def stream(self, engine, question):
+        """Yield token events, then the answer event for the client."""
+        if self.qa is not None:
+            await self.qa.wait_saved()
+        async for event in self.chain(engine).astream(question):
+            if event['type'] == 'token':
+                yield event
+                continue
+
+            response = {
+                'type': 'answer',
+                'question': event['question'],
+                'answer': event['answer'],
+                'generated_question': event.get('generated_question'),
+                'cached': bool(event.get('cached')),
+                'sources': sorted({doc.metadata.get('source', '') for doc in event.get('source_documents', [])}),
+                'time_to_first_token': event['time_to_first_token'],
+                'seconds': event['seconds'],
+                'version': engine.version,
+            }
+            if engine.query_cache is not None:
+                response['query_cache'] = engine.query_cache.summary()
+            yield response
+
+    async def ask(self, engine, question):
+        async for event in self.stream(engine, question):
+            if event['type'] == 'answer':
+                return event
+
+    async def undo(self):
+        if self.qa is not None:
+            await self.qa.wait_saved()
+        if self.memory is not None and len(self.memory.chat_memory.messages) >= 2:
+            self.memory.chat_memory.messages.pop()
+            self.memory.chat_memory.messages.pop()
+
+
+class QueryService():
+    """Sessions over one QueryEngine, hot-swapped when the database is rebuilt.
+
+    A new engine is loaded on a worker thread while the current one keeps
+    serving; the swap is a single reference assignment, and requests already
+    running finish on the engine they started with.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.engine = None
+        self.sessions = {}
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+
+    def load(self):
+        self.engine = QueryEngine(self.db_path)
+
+    def reload(self, force=False):
+        """Swap in the database under db_path if its version changed."""
+        with self._reload_lock:
+            if not force and read_index_version(self.db_path) == self.engine.version:
+                return False
+            self.engine = QueryEngine(self.db_path)
+            self.reloads += 1
+            return True
+
+    def create_session(self):
+        session = Session()
+        self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+        session.last_used = time.time()
+        return session
+
+    def expire_sessions(self, ttl):
+        cutoff = time.time() - ttl
+        for session_id, session in list(self.sessions.items()):
+            if session.last_used < cutoff and not session.lock.locked():
+                del self.sessions[session_id]
+
+
+service = QueryService(get_db_path())
+
+
+async def _watch(config):
+    """Expire idle sessions and swap in rebuilt databases."""
+    interval = config['reload_interval'] or 60
+    while True:
+        await asyncio.sleep(interval)
+        service.expire_sessions(config['session_ttl'])
+        if config['reload_interval']:
+            try:
+                await asyncio.to_thread(service.reload)
+            except Exception:
+                # Keep serving the current database; the next check retries
+                pass
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(service.load)
+    watcher = asyncio.create_task(_watch(get_service_config()))
+    yield
+    watcher.cancel()
+
+
+app = FastAPI(title="Workshop Query Service", lifespan=lifespan)
+
+
+class Question(BaseModel):
+    question: str
+
+
+@app.get("/health")
+def health():
+    return {'version': service.engine.version, 'sessions': len(service.sessions), 'reloads': service.reloads}
+
+
+@app.post("/sessions")
+def create_session():
+    return {'session_id': service.create_session().id}
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    service.sessions.pop(session_id, None)
+    return {'deleted': session_id}
+
+
+@app.post("/sessions/{session_id}/undo")
+async def undo(session_id: str):
+    session = service.get_session(session_id)
+    async with session.lock:
+        await session.undo()
+    return {'session_id': session_id}
+
+
+@app.post("/sessions/{session_id}/ask")
+async def ask(session_id: str, body: Question):
+    session = service.get_session(session_id)
+    async with session.lock:
+        return await session.ask(service.engine, body.question)
+
+
+@app.post("/reload")
+async def reload():
+    swapped = await asyncio.to_thread(service.reload, True)
+    return {'reloaded': swapped, 'version': service.engine.version}
+
+
+@app.websocket("/sessions/{session_id}/stream")
+async def stream(websocket: WebSocket, session_id: str):
+    """Answer each {"question": ...} message with token messages carrying
+    the new text, then one answer message."""
+    await websocket.accept()
+    session = service.sessions.get(session_id)
+    if session is None:
+        await websocket.close(code=4404, reason=f"Unknown session {session_id}")
+        return
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            session.last_used = time.time()
+            async with session.lock:
+                try:
+                    async for event in session.stream(service.engine, message['question']):
+                        await websocket.send_json(event)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    await websocket.send_json({'type': 'error', 'error': f'{type(e).__name__}: {e}'})
+    except WebSocketDisconnect:
+        pass
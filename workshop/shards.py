@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+SHARDS_FILE = 'shards.json'
+DEFAULT_SHARD = 'default'
+
+
+class Shard():
+    """A named group of FileSystemModels built into its own database directory."""
+
+    def __init__(self, name, models, path):
+        self.name = name
+        self.models = models
+        self.path = Path(path)
+
+
+def is_sharded(models):
+    return any(model.shard is not None for model in models)
+
+
+def group_shards(models, db_path):
+    """Group models by their shard name.
+
+    When no model names a shard the single database lives directly in db_path,
+    as it always has; otherwise each shard gets a sub-directory of db_path.
+    """
+    if not is_sharded(models):
+        return [Shard(DEFAULT_SHARD, models, db_path)]
+
+    grouped = {}
+    for model in models:
+        grouped.setdefault(model.shard or DEFAULT_SHARD, []).append(model)
+    return [Shard(name, group, Path(db_path, name)) for name, group in grouped.items()]
+
+
+def save_shard_names(db_path, names):
+    path = Path(db_path, SHARDS_FILE)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'shards': sorted(names)}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def remove_shard_names(db_path):
+    """Go back to the unsharded layout, where db_path holds the database."""
+    Path(db_path, SHARDS_FILE).unlink(missing_ok=True)
+
+
+def load_shard_names(db_path):
+    path = Path(db_path, SHARDS_FILE)
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)['shards']
+
+
+class ShardedFAISS():
+    """Several FAISS stores searched concurrently as if they were one.
+
+    Each shard is searched with the same query vector on a thread pool (faiss
+    releases the GIL while searching) and the results are merged by distance.
+    """
+
+    def __init__(self, shards, embeddings, max_workers=None):
+        self.shards = shards
+        self.embeddings = embeddings
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(shards))
+
+    def _fan_out(self, search, k):
+        futures = [self.executor.submit(search, shard) for shard in self.shards.values()]
+        results = [item for future in futures for item in future.result()]
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return self._fan_out(
+            lambda shard: shard.similarity_search_with_score_by_vector(embedding, k=k, **kwargs), k
+        )
+
+    def max_marginal_relevance_search_with_score_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        """MMR within each shard, then the closest k across shards."""
+        return self._fan_out(
+            lambda shard: shard.max_marginal_relevance_search_with_score_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, **kwargs
+            ), k
+        )
+
+    def similarity_search(self, query, k=4, **kwargs):
+        embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def as_retriever(self, search_type='similarity', search_kwargs=None):
+        return ShardedRetriever(store=self, search_type=search_type, search_kwargs=search_kwargs or {})
+
+
+class ShardedRetriever(BaseRetriever):
+    """Retriever over a ShardedFAISS, embedding the query once for all shards."""
+
+    store: Any
+    search_type: str = 'similarity'
+    search_kwargs: Dict[str, Any] = {}
+
+    def _search_by_vector(self, embedding):
+        if self.search_type == 'mmr':
+            results = self.store.max_marginal_relevance_search_with_score_by_vector(embedding, **self.search_kwargs)
+        else:
+            results = self.store.similarity_search_with_score_by_vector(embedding, **self.search_kwargs)
+        return [doc for doc, _ in results]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._search_by_vector(self.store.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        embedding = await self.store.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._search_by_vector, embedding)
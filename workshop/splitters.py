@@ -1,6 +1,57 @@
+import os
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter, Language 
+from langchain_community.document_loaders.parsers.language.language_parser import LANGUAGE_EXTENSIONS, LANGUAGE_SEGMENTERS
+from langchain_core.documents import Document
+
+from .parsers import PHPSegmenter, SpanCache
+from .tokens import DEFAULT_ENCODING, count_tokens, get_token_length_function, split_tokens
+
+LANGUAGE_EXTENSIONS['php'] = Language.PHP
+LANGUAGE_EXTENSIONS['module'] = Language.PHP
+LANGUAGE_EXTENSIONS['inc'] = Language.PHP
+LANGUAGE_SEGMENTERS[Language.PHP] = PHPSegmenter
+
+# Languages with splitter separators but no LanguageParser segmenter
+SPLITTER_EXTENSIONS = {
+    'md': Language.MARKDOWN,
+    'html': Language.HTML,
+}
+
+class BudgetedTextSplitter(RecursiveCharacterTextSplitter):
+    """RecursiveCharacterTextSplitter that can measure chunks in tokens.
+
+    With length_mode='tokens' chunk_size and chunk_overlap count tokens of the
+    embedding model's encoding instead of characters. When max_tokens is set,
+    any chunk still over it (e.g. a minified line with no separators) is cut
+    on token boundaries, so every chunk fits the embeddings request limit.
+    """
 
-class PHPTextSplitter(RecursiveCharacterTextSplitter):
+    def __init__(self, length_mode='characters', encoding_name=DEFAULT_ENCODING, max_tokens=None, **kwargs):
+        if length_mode == 'tokens':
+            kwargs['length_function'] = get_token_length_function(encoding_name)
+        elif length_mode != 'characters':
+            raise ValueError(f"Unknown length_mode {length_mode}, expected 'characters' or 'tokens'")
+        super().__init__(**kwargs)
+        self.encoding_name = encoding_name
+        self.max_tokens = max_tokens
+
+    def split_text(self, text):
+        chunks = super().split_text(text)
+        if not self.max_tokens:
+            return chunks
+
+        fitted = []
+        for chunk in chunks:
+            # Every token covers at least one byte, so only chunks with more
+            # bytes than max_tokens need counting
+            if len(chunk.encode('utf-8')) > self.max_tokens and count_tokens(chunk, self.encoding_name) > self.max_tokens:
+                fitted.extend(split_tokens(chunk, self.max_tokens, encoding_name=self.encoding_name))
+            else:
+                fitted.append(chunk)
+        return fitted
+
+class PHPTextSplitter(BudgetedTextSplitter):
     """Attempts to split the text along PHP-formatted layout elements."""
 
     def __init__(self, **kwargs):
@@ -8,7 +59,7 @@ class PHPTextSplitter(RecursiveCharacterTextSplitter):
         separators = self.get_separators_for_language(Language.PHP)
         super().__init__(separators=separators, **kwargs)
 
-class CSharpTextSplitter(RecursiveCharacterTextSplitter):
+class CSharpTextSplitter(BudgetedTextSplitter):
     """Attempts to split the text along PHP-formatted layout elements."""
 
     def __init__(self, **kwargs):
@@ -16,3 +67,124 @@ class CSharpTextSplitter(RecursiveCharacterTextSplitter):
         separators = self.get_separators_for_language(Language.CSHARP)
         super().__init__(separators=separators, **kwargs)
 
+
+def get_language(source):
+    """The Language for a file path from LANGUAGE_EXTENSIONS, or None."""
+    extension = os.path.splitext(str(source))[1][1:].lower()
+    language = LANGUAGE_EXTENSIONS.get(extension) or SPLITTER_EXTENSIONS.get(extension)
+    if language is None:
+        return None
+    try:
+        return Language(language)
+    except ValueError:
+        return None
+
+
+class LanguageSplitter():
+    """Routes each document to a splitter for its language.
+
+    PHP is first segmented along functions and classes with PHPSegmenter, plus
+    a simplified outline of the file, as LanguageParser does; other languages
+    in LANGUAGE_EXTENSIONS use their RecursiveCharacterTextSplitter separators
+    and anything else falls back to the CSharpTextSplitter.
+    """
+
+    def __init__(
+        self,
+        chunk_size=6000,
+        chunk_overlap=200,
+        length_mode='characters',
+        encoding_name=DEFAULT_ENCODING,
+        max_tokens=None,
+        segment_php=True,
+        php_span_cache_path=None
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_mode = length_mode
+        self.encoding_name = encoding_name
+        self.max_tokens = max_tokens
+        self.segment_php = segment_php
+        self.php_span_cache = SpanCache(php_span_cache_path) if php_span_cache_path else None
+        self._splitters = {}
+
+    def __getstate__(self):
+        # Splitters are rebuilt on demand in worker processes
+        state = self.__dict__.copy()
+        state['_splitters'] = {}
+        return state
+
+    def settings(self):
+        """Everything that decides how a file is chunked, as JSON-able values.
+
+        build.py keeps these in the manifest and re-splits every file when
+        they change, since unchanged files would otherwise keep their old chunks.
+        """
+        routing = {**SPLITTER_EXTENSIONS, **LANGUAGE_EXTENSIONS}
+        return {
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'length_mode': self.length_mode,
+            'encoding_name': self.encoding_name,
+            'max_tokens': self.max_tokens,
+            'segment_php': self.segment_php,
+            'routing': {extension: getattr(language, 'value', str(language)) for extension, language in sorted(routing.items())},
+        }
+
+    def _get_splitter(self, language):
+        splitter = self._splitters.get(language)
+        if splitter is None:
+            kwargs = {
+                'chunk_size': self.chunk_size,
+                'chunk_overlap': self.chunk_overlap,
+                'length_mode': self.length_mode,
+                'encoding_name': self.encoding_name,
+                'max_tokens': self.max_tokens,
+            }
+            if language == Language.PHP:
+                splitter = PHPTextSplitter(**kwargs)
+            elif language is None:
+                splitter = CSharpTextSplitter(**kwargs)
+            else:
+                try:
+                    separators = RecursiveCharacterTextSplitter.get_separators_for_language(language)
+                    splitter = BudgetedTextSplitter(separators=separators, is_separator_regex=True, **kwargs)
+                except ValueError:
+                    splitter = CSharpTextSplitter(**kwargs)
+            self._splitters[language] = splitter
+        return splitter
+
+    def _segment_php(self, document):
+        segmenter = PHPSegmenter(document.page_content, span_cache=self.php_span_cache)
+        try:
+            if not segmenter.is_valid():
+                return [document]
+            functions_classes = segmenter.extract_functions_classes()
+            simplified_code = segmenter.simplify_code()
+        except Exception:
+            # phply does not cover every PHP dialect; split the file as text
+            return [document]
+
+        segments = [
+            Document(page_content=code, metadata={**document.metadata, 'content_type': 'functions_classes'})
+            for code in functions_classes
+        ]
+        segments.append(Document(
+            page_content=simplified_code,
+            metadata={**document.metadata, 'content_type': 'simplified_code'}
+        ))
+        return segments
+
+    def split_document(self, document):
+        language = get_language(document.metadata.get('source', ''))
+        metadata = {**document.metadata, 'language': language.value if language else None}
+        document = Document(page_content=document.page_content, metadata=metadata)
+
+        documents = [document]
+        if language == Language.PHP and self.segment_php:
+            documents = self._segment_php(document)
+
+        return self._get_splitter(language).split_documents(documents)
+
+    def split_documents(self, documents):
+        return [text for document in documents for text in self.split_document(document)]
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+
+from collections.abc import Mapping
+from pathlib import Path
+
+import faiss
+
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from .indexes import ANN_INDEX_FILE, load_index_meta, apply_search_params
+from .lexical import LexicalIndex
+from .shards import ShardedFAISS, load_shard_names
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'docstore.sqlite'
+INDEX_VERSION_FILE = 'index_version'
+
+
+class SQLiteReader():
+    """A read-only SQLite connection opened when the database is loaded.
+
+    A rebuild replaces the file rather than writing to it, so the open
+    connection keeps reading the docstore that matches the index loaded with
+    it until the service swaps engines. Connections opened later, e.g. per
+    thread, would read the new file against the old index. Queries from
+    several threads share the connection under a lock; each is a lookup by
+    key, so they are short.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # immutable: the open file never changes, so SQLite can skip locking
+        self._conn = sqlite3.connect(f'file:{self.path}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+
+    def fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class SQLiteDocstore(Docstore):
+    """Chunk text and metadata fetched lazily by id from SQLite."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def search(self, search):
+        row = self.reader.fetchone('SELECT page_content, metadata FROM docs WHERE id = ?', (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+
+class SQLiteIndexMapping(Mapping):
+    """Index position to docstore id mapping read from SQLite on demand."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __getitem__(self, position):
+        row = self.reader.fetchone('SELECT id FROM docs WHERE position = ?', (int(position),))
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __iter__(self):
+        for (position,) in self.reader.fetchall('SELECT position FROM docs ORDER BY position'):
+            yield position
+
+    def __len__(self):
+        return self.reader.fetchone('SELECT COUNT(*) FROM docs')[0]
+
+    def positions(self, ids):
+        """Index positions of the given docstore ids, skipping unknown ids."""
+        placeholders = ','.join('?' * len(ids))
+        rows = self.reader.fetchall(f'SELECT id, position FROM docs WHERE id IN ({placeholders})', list(ids))
+        return dict(rows)
+
+
+def write_faiss_index(index, path):
+    """Write a FAISS index to a temporary file and move it into place.
+
+    A running query service has the current file memory-mapped; replacing it
+    with a new inode leaves that mapping intact, where writing in place would
+    truncate it under the reader.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    faiss.write_index(index, str(tmp_path))
+    os.replace(tmp_path, path)
+
+
+def save_database(db, path):
+    """FAISS.save_local, replacing index.faiss and index.pkl atomically."""
+    tmp_dir = Path(path, 'save.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    db.save_local(tmp_dir)
+    for name in os.listdir(tmp_dir):
+        os.replace(Path(tmp_dir, name), Path(path, name))
+    tmp_dir.rmdir()
+
+
+def save_docstore(db, path):
+    """Write a FAISS store's docstore to DOCSTORE_FILE, replacing it atomically."""
+    path = Path(path, DOCSTORE_FILE)
+    tmp_path = path.with_suffix('.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(
+        'CREATE TABLE docs (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, '
+        'page_content TEXT NOT NULL, metadata TEXT NOT NULL)'
+    )
+
+    def rows():
+        for position, doc_id in db.index_to_docstore_id.items():
+            doc = db.docstore.search(doc_id)
+            yield position, doc_id, doc.page_content, json.dumps(doc.metadata, default=str)
+
+    conn.executemany('INSERT INTO docs VALUES (?, ?, ?, ?)', rows())
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def write_index_version(path, version=None):
+    """Stamp a database with a new version, invalidating query caches built on it."""
+    version = version or uuid.uuid4().hex
+    path = Path(path, INDEX_VERSION_FILE)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_build_version(path):
+    """The version last written to one database directory, or None."""
+    version_path = Path(path, INDEX_VERSION_FILE)
+    if not version_path.exists():
+        return None
+    return version_path.read_text().strip()
+
+
+def read_index_version(path):
+    """The version written by the last build, combined over shards.
+
+    Databases built before versions were written fall back to the index
+    file's modification time.
+    """
+    shard_names = load_shard_names(path)
+    if shard_names is not None:
+        versions = [f'{name}={read_index_version(Path(path, name))}' for name in shard_names]
+        return hashlib.sha256('\n'.join(versions).encode('utf-8')).hexdigest()[:32]
+
+    version = read_build_version(path)
+    if version is not None:
+        return version
+    index_path = Path(path, INDEX_FILE)
+    return f'mtime-{index_path.stat().st_mtime_ns}' if index_path.exists() else 'none'
+
+
+def read_index_mmap(path):
+    """Open a FAISS index memory-mapped and read-only, so the OS page cache
+    is shared between processes; falls back to a normal read for index types
+    that cannot be mapped."""
+    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(str(path), flags)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+
+def load_database(embeddings, path):
+    """Load a database for querying.
+
+    Uses the mmap index and SQLite docstore when the build exported one, which
+    avoids unpickling the docstore on startup, otherwise FAISS.load_local.
+    When the build produced an ANN index it is opened instead of the flat
+    index, with the search parameters saved in its metadata. A sharded
+    database is loaded as a ShardedFAISS over every shard. The BM25 index,
+    when built, is attached memory-mapped as db.lexical_index.
+    """
+    shard_names = load_shard_names(path)
+    if shard_names is not None:
+        shards = {name: load_database(embeddings, Path(path, name)) for name in shard_names}
+        return ShardedFAISS(shards, embeddings)
+
+    if not Path(path, DOCSTORE_FILE).exists():
+        db = FAISS.load_local(path, embeddings=embeddings, allow_dangerous_deserialization=True)
+        db.lexical_index = LexicalIndex.load(path)
+        return db
+
+    meta = load_index_meta(path)
+    if meta['type'] == 'flat':
+        index = read_index_mmap(Path(path, INDEX_FILE))
+    else:
+        index = read_index_mmap(Path(path, ANN_INDEX_FILE))
+        apply_search_params(index, meta)
+
+    reader = SQLiteReader(Path(path, DOCSTORE_FILE))
+    db = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SQLiteDocstore(reader),
+        index_to_docstore_id=SQLiteIndexMapping(reader),
+    )
+    db.lexical_index = LexicalIndex.load(path)
+    return db
@@ -0,0 +1,53 @@
+from functools import lru_cache
+
+import tiktoken
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name=DEFAULT_ENCODING):
+    """Return a tiktoken encoder, built once per process."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text, encoding_name=DEFAULT_ENCODING):
+    return len(get_encoder(encoding_name).encode_ordinary(text))
+
+
+def count_tokens_batch(texts, encoding_name=DEFAULT_ENCODING):
+    """Token counts for many texts, encoded on tiktoken's thread pool."""
+    return [len(tokens) for tokens in get_encoder(encoding_name).encode_ordinary_batch(texts)]
+
+
+@lru_cache(maxsize=None)
+def get_token_length_function(encoding_name=DEFAULT_ENCODING, memo_chars=2000):
+    """A token counter for text splitters, memoised for short pieces.
+
+    Recursive splitting measures the same pieces repeatedly while merging, so
+    counts of pieces up to memo_chars characters are cached; longer texts are
+    rarely measured twice and would only pin memory as cache keys.
+    """
+    encoder = get_encoder(encoding_name)
+
+    @lru_cache(maxsize=8192)
+    def cached_length(text):
+        return len(encoder.encode_ordinary(text))
+
+    def length(text):
+        if len(text) > memo_chars:
+            return len(encoder.encode_ordinary(text))
+        return cached_length(text)
+
+    return length
+
+
+def split_tokens(text, max_tokens, overlap=0, encoding_name=DEFAULT_ENCODING):
+    """Hard split text into windows of at most max_tokens tokens."""
+    encoder = get_encoder(encoding_name)
+    tokens = encoder.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return [text]
+
+    step = max(1, max_tokens - overlap)
+    return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), step)]
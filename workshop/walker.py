@@ -0,0 +1,233 @@
+import os
+import re
+
+from pathlib import Path
+
+# Directories that never contain source worth indexing. They are pruned before
+# descending so their (often huge) contents are never listed.
+DEFAULT_PRUNED_DIRS = [
+    '.git', '.hg', '.svn', '.vs', '.idea', '.vscode',
+    'node_modules', 'bin', 'obj', '__pycache__', '.venv', 'venv',
+]
+
+
+def glob_to_regex(pattern):
+    """Translate a pathlib style glob (with ``**``) into a regex source string
+    matching posix paths relative to the walk root."""
+    if pattern.startswith('./'):
+        pattern = pattern[2:]
+    pattern = pattern.lstrip('/')
+
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif c == '*':
+            out.append('[^/]*')
+            i += 1
+        elif c == '?':
+            out.append('[^/]')
+            i += 1
+        elif c == '[':
+            j = pattern.find(']', i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:j]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return ''.join(out)
+
+
+def compile_globs(patterns):
+    """Compile several globs into one matcher, or None when there are none."""
+    if not patterns:
+        return None
+    # The anchor has to apply to every alternative, not just the last
+    return re.compile('(?:' + '|'.join(f'(?:{glob_to_regex(p)})' for p in patterns) + r')\Z')
+
+
+def _literal_prefix(pattern):
+    """Return the leading path components of a glob that contain no wildcards."""
+    if pattern.startswith('./'):
+        pattern = pattern[2:]
+    parts = []
+    for part in pattern.strip('/').split('/'):
+        if any(c in part for c in '*?['):
+            break
+        parts.append(part)
+    # The last component names files, not a directory to descend into
+    if len(parts) == len(pattern.strip('/').split('/')):
+        parts = parts[:-1]
+    return '/'.join(parts)
+
+
+class GitIgnore():
+    """Rules from a single ``.gitignore`` file, relative to the directory that holds it."""
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            if '/' in line:
+                regex = glob_to_regex(line)
+            else:
+                regex = '(?:.*/)?' + glob_to_regex(line)
+            self.rules.append((re.compile(regex + r'\Z'), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, base, path):
+        try:
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                return cls(base, f.readlines())
+        except OSError:
+            return None
+
+    def match(self, rel_path, is_dir):
+        """Return True/False if a rule decides the path, None otherwise."""
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return None
+            rel_path = rel_path[len(self.base) + 1:]
+
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                result = not negate
+        return result
+
+
+class DirectoryWalker():
+    """Single pass, ``os.scandir`` based replacement for globbing a tree.
+
+    Excluded and ignored directories are pruned before they are listed, and
+    include/exclude globs are compiled to regular expressions once, so each
+    entry costs a couple of string operations and no extra ``stat`` calls.
+    """
+
+    def __init__(
+        self,
+        path,
+        includes=['**/*'],
+        suffixes=[],
+        excludes=[],
+        excludes_matching=[],
+        prune=DEFAULT_PRUNED_DIRS,
+        use_gitignore=True
+    ):
+        self.path = Path(path)
+        self.suffixes = set(suffixes)
+        self.excludes_matching = excludes_matching
+        self.prune = set(prune)
+        self.use_gitignore = use_gitignore
+
+        self._includes = compile_globs(includes)
+        self._include_prefixes = [_literal_prefix(p) for p in includes]
+
+        # Excludes of the form "dir/**" prune the directory itself
+        dir_excludes = [p[:-len('/**/*')] for p in excludes if p.endswith('/**/*')]
+        dir_excludes += [p[:-len('/**')] for p in excludes if p.endswith('/**')]
+        self._dir_excludes = compile_globs(dir_excludes)
+        self._excludes = compile_globs(excludes)
+
+    def _descend(self, rel_dir):
+        """Whether a directory can contain a path matched by the includes."""
+        for prefix in self._include_prefixes:
+            if not prefix or rel_dir == prefix or rel_dir.startswith(prefix + '/') or prefix.startswith(rel_dir + '/'):
+                return True
+        return False
+
+    def _ignored(self, ignores, rel_path, is_dir):
+        result = False
+        for ignore in ignores:
+            decision = ignore.match(rel_path, is_dir)
+            if decision is not None:
+                result = decision
+        return result
+
+    def walk(self):
+        root = str(self.path)
+        stack = [('', [])]
+
+        while stack:
+            rel_dir, ignores = stack.pop()
+            abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+
+            if self.use_gitignore:
+                ignore = GitIgnore.from_file(rel_dir, os.path.join(abs_dir, '.gitignore'))
+                if ignore is not None and ignore.rules:
+                    ignores = ignores + [ignore]
+
+            try:
+                with os.scandir(abs_dir) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except (PermissionError, FileNotFoundError, NotADirectoryError):
+                continue
+
+            subdirs = []
+            for entry in entries:
+                rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if entry.name in self.prune:
+                        continue
+                    if self._dir_excludes and self._dir_excludes.match(rel_path):
+                        continue
+                    if ignores and self._ignored(ignores, rel_path, True):
+                        continue
+                    if self.excludes_matching and any(pattern in entry.path for pattern in self.excludes_matching):
+                        continue
+                    if not self._descend(rel_path):
+                        continue
+                    subdirs.append((rel_path, ignores))
+                    continue
+
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if self.suffixes and os.path.splitext(entry.name)[1] not in self.suffixes:
+                    continue
+                if self._includes and not self._includes.match(rel_path):
+                    continue
+                if self._excludes and self._excludes.match(rel_path):
+                    continue
+                if ignores and self._ignored(ignores, rel_path, False):
+                    continue
+
+                path = entry.path
+                if self.excludes_matching and any(pattern in path for pattern in self.excludes_matching):
+                    continue
+                yield Path(path)
+
+            # Reverse so directories are visited in sorted order
+            stack.extend(reversed(subdirs))